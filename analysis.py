@@ -1,62 +1,273 @@
 # =============================
 # analysis.py
 # =============================
+# Exploratory statistics and plots of the parsed traces, as a callable stage.
+#
+# - char_len / num_lines / num_spaces / num_special per trace, in one pass:
+#   from the trace store's calls + offsets (digit counts, no text is built) or,
+#   without a store, from one byte-class scan over each CSV chunk
+# - the columns go through feature_cache.py, keyed by the input's content hash
+#   (the store checksum or the CSV's sha256) and the statistics code
+# - each plot is re-rendered only when the hash of its own input columns or its
+#   parameters changed (or the PNG is missing)
+# - histograms / box plots are computed with NumPy; beyond max_points traces the
+#   histogram and the box-plot outliers use a uniform subsample
+#
+#   python analysis.py
+#   python analysis.py --features-csv adfa_features.csv --force
+import argparse
+import hashlib
+import json
+from pathlib import Path
 
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from pathlib import Path
+import pandas as pd
+
+from feature_cache import CACHE_DIR as FEATURE_CACHE_DIR, cached_frame, source_hash
+from instrumentation import instrument, stage
+from score_cache import artifact_key
+from trace_store import CSV_FILE, STORE_DIR, TraceStore, data_fingerprint, has_store
+
+CACHE_DIR = "analysis_cache"  # plot state
+COLUMNS = ["char_len", "num_lines", "num_spaces", "num_special"]
+CHUNK_CALLS = 1 << 24
+CHUNK_ROWS = 10_000
+
+# --------------------------
+# Statistics
+# --------------------------
+def store_stats(store=STORE_DIR, chunk_calls=CHUNK_CALLS):
+    """Columns for every trace of a store, as they would be for its CSV text.
+
+    The CSV text of a trace is its call IDs joined by single spaces, so
+    char_len = digits + (n - 1) spaces, with no newlines or special characters.
+    """
+    ts = TraceStore(store)
+    n = len(ts)
+    char_len = np.zeros(n, dtype=np.int64)
+    start = 0
+    while start < n:
+        stop = int(np.searchsorted(ts.offsets, ts.offsets[start] + chunk_calls, side="right")) - 1
+        stop = min(max(stop, start + 1), n)
+        offsets = np.asarray(ts.offsets[start:stop + 1])
+        calls = np.asarray(ts.calls[offsets[0]:offsets[-1]])
+        digits = np.ones(len(calls), dtype=np.int64)
+        for p in (10, 100, 1000, 10000):
+            digits += calls >= p
+        cs = np.zeros(len(calls) + 1, dtype=np.int64)
+        np.cumsum(digits, out=cs[1:])
+        char_len[start:stop] = cs[offsets[1:] - offsets[0]] - cs[offsets[:-1] - offsets[0]]
+        start = stop
+    lengths = np.diff(np.asarray(ts.offsets))
+    spaces = np.maximum(lengths - 1, 0)
+    return pd.DataFrame({
+        "label": np.asarray(ts.labels).astype(int),
+        "char_len": char_len + spaces,
+        "num_lines": np.zeros(n, dtype=np.int64),
+        "num_spaces": spaces,
+        "num_special": np.zeros(n, dtype=np.int64),
+    })
+
+
+# byte classes: 1 = counts as a character (not a UTF-8 continuation byte),
+# 2 = newline, 4 = space, 8 = ASCII letter / digit / space (not "special")
+_BYTE_CLASS = np.zeros(256, dtype=np.uint8)
+_BYTE_CLASS[:0x80] |= 1
+_BYTE_CLASS[0xC0:] |= 1
+_BYTE_CLASS[ord("\n")] |= 2
+_BYTE_CLASS[ord(" ")] |= 4 | 8
+for _lo, _hi in (("0", "9"), ("A", "Z"), ("a", "z")):
+    _BYTE_CLASS[ord(_lo):ord(_hi) + 1] |= 8
+
+
+def text_stats(texts):
+    """Columns for an iterable of texts, in one scan over their UTF-8 bytes.
+
+    Same values as str.len / str.count("\\n") / str.count(" ") / the length left
+    after removing [A-Za-z0-9 ].
+    """
+    encoded = [str(t).encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    cls = _BYTE_CLASS[np.frombuffer(b"".join(encoded), dtype=np.uint8)]
+
+    def per_text(mask):
+        cs = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask, out=cs[1:])
+        return cs[offsets[1:]] - cs[offsets[:-1]]
+
+    chars = per_text(cls & 1)
+    return pd.DataFrame({
+        "char_len": chars,
+        "num_lines": per_text((cls & 2) > 0),
+        "num_spaces": per_text((cls & 4) > 0),
+        "num_special": chars - per_text((cls & 8) > 0),
+    })
+
+
+def csv_stats(csv=CSV_FILE, chunk_rows=CHUNK_ROWS):
+    parts = []
+    for df in pd.read_csv(csv, chunksize=chunk_rows, keep_default_na=False):
+        stats = text_stats(df["text"])
+        stats.insert(0, "label", df["label"].astype(int).to_numpy())
+        parts.append(stats)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["label"] + COLUMNS)
+
+# --------------------------
+# Cached columns
+# --------------------------
+def load_columns(store=STORE_DIR, csv=CSV_FILE, force=False):
+    """(columns frame, input key), computed once per input content and statistics code"""
+    key = data_fingerprint(store, csv)
+
+    def compute():
+        with stage("analysis_columns") as st:
+            df = store_stats(store) if has_store(store) else csv_stats(csv)
+            st.rows = len(df)
+        return df
+
+    df = cached_frame("analysis", compute, ["label"] + COLUMNS,
+                      [key, source_hash(store_stats, text_stats, csv_stats)],
+                      cache_dir=FEATURE_CACHE_DIR, force=force)
+    df["label"] = df["label"].astype(int)
+    return df, key
+
+
+def column_hash(values):
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+# --------------------------
+# Plots
+# --------------------------
+def _subsample(n, max_points, seed=0):
+    if n <= max_points:
+        return slice(None)
+    return np.sort(np.random.default_rng(seed).choice(n, max_points, replace=False))
+
+
+def plot_char_length(df, path, bins=50, max_points=1_000_000):
+    import matplotlib.pyplot as plt
+
+    values = df["char_len"].to_numpy()
+    sample = values[_subsample(len(values), max_points)]
+    counts, edges = np.histogram(sample, bins=bins)
+    plt.figure(figsize=(10, 5))
+    plt.stairs(counts * (len(values) / max(len(sample), 1)), edges, fill=True)
+    plt.title("Character Length Distribution")
+    plt.xlabel("Char Length")
+    plt.ylabel("Count")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def _box_stats(values, sample, label):
+    """matplotlib bxp() stats: exact quartiles / whiskers, outliers from the sample"""
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    lo, hi = (inside.min(), inside.max()) if len(inside) else (q1, q3)
+    return {"label": label, "med": med, "q1": q1, "q3": q3, "whislo": lo, "whishi": hi,
+            "fliers": sample[(sample < lo) | (sample > hi)]}
+
+
+def plot_char_len_by_class(df, path, max_points=1_000_000):
+    import matplotlib.pyplot as plt
+
+    stats = []
+    for label, name in ((0, "Normal"), (1, "Attack")):
+        values = df.loc[df["label"] == label, "char_len"].to_numpy()
+        if len(values):
+            stats.append(_box_stats(values, values[_subsample(len(values), max_points)], name))
+    plt.figure(figsize=(10, 5))
+    plt.gca().bxp(stats, showfliers=True)
+    plt.title("Character Length by Class")
+    plt.xlabel("label")
+    plt.ylabel("char_len")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def plot_correlation(df, path):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(8, 5))
+    sns.heatmap(df[COLUMNS].corr(), annot=True)
+    plt.title("Feature Correlation")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+PLOTS = {
+    # file: (function, input columns)
+    "char_length_dist.png": (plot_char_length, ["char_len"]),
+    "char_len_by_class.png": (plot_char_len_by_class, ["char_len", "label"]),
+    "correlation_heatmap.png": (plot_correlation, COLUMNS),
+}
+
+# --------------------------
+# Stage
+# --------------------------
+@instrument("analysis")
+def run_analysis(store=STORE_DIR, csv=CSV_FILE, out_dir=".", cache_dir=CACHE_DIR, features_csv=None,
+                 max_points=1_000_000, force=False, verbose=True):
+    """Compute (or load) the columns and re-render the plots whose inputs changed.
+
+    Returns the columns frame and the list of plot files that were rendered.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.style.use("ggplot")
+
+    df, key = load_columns(store, csv, force)
+    if verbose:
+        print(f"\n=== {len(df):,} traces (input {key[:12]}) ===")
+        print(df.groupby("label")[COLUMNS].describe().T)
+
+    if features_csv:
+        meta = TraceStore(store).frame().reset_index(drop=True) if has_store(store) else \
+            pd.read_csv(csv, usecols=["split", "file"])
+        pd.concat([meta[["split", "file"]], df], axis=1).to_csv(features_csv, index=False)
+        print(f"Features saved → {features_csv}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = Path(cache_dir) / "plots.json"
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    hashes = {c: column_hash(df[c].to_numpy()) for c in ["label"] + COLUMNS}
+    rendered = []
+    for name, (fn, inputs) in PLOTS.items():
+        path = out_dir / name
+        params = {"max_points": max_points} if fn is not plot_correlation else {}
+        plot_key = artifact_key(name, [hashes[c] for c in inputs], params)
+        if not force and path.exists() and state.get(str(path)) == plot_key:
+            continue
+        with stage(f"plot_{path.stem}"):
+            fn(df, path, **params)
+        state[str(path)] = plot_key
+        rendered.append(str(path))
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    state_path.write_text(json.dumps(state, indent=2))
+
+    if verbose:
+        print(f"Rendered {len(rendered)} plot(s), {len(PLOTS) - len(rendered)} up to date in {out_dir}/")
+    return df, rendered
+
 
-# ---------- Settings ----------
-plt.style.use("ggplot")
-Path("plots").mkdir(exist_ok=True)
-
-# ---------- Load Data ----------
-df = pd.read_csv("adfa_parsed.csv")
-
-print("\n=== Basic Info ===")
-print(df.head())
-print(df.info())
-
-# ---------- Feature Engineering ----------
-df["char_len"] = df["text"].str.len()
-df["num_lines"] = df["text"].str.count("\n")
-df["num_spaces"] = df["text"].str.count(" ")
-df["num_special"] = df["text"].str.replace("[A-Za-z0-9 ]", "", regex=True).str.len()
-
-# Save new data if needed
-df.to_csv(r"E:\Rev-DataScience\AI-ML\semi-structured\adfa_features.csv", index=False)
-
-# ---------- VISUALIZATION ----------
-
-# 1) Histogram of char length
-plt.figure(figsize=(10,5))
-sns.histplot(df["char_len"], bins=50)
-plt.title("Character Length Distribution")
-plt.xlabel("Char Length")
-plt.ylabel("Count")
-plt.tight_layout()
-plt.savefig("char_length_dist.png")
-plt.close()
-
-# 2) Compare char_len per split
-plt.figure(figsize=(10,5))
-sns.boxplot(data=df, x="label", y="char_len")
-plt.title("Character Length by Class")
-plt.xticks([0,1], ["Normal", "Attack"])
-plt.tight_layout()
-plt.savefig("char_len_by_class.png")
-plt.close()
-
-# 3) Heatmap
-plt.figure(figsize=(8,5))
-sns.heatmap(df[["char_len","num_lines","num_spaces","num_special"]].corr(), annot=True)
-plt.title("Feature Correlation")
-plt.tight_layout()
-plt.savefig("correlation_heatmap.png")
-plt.close()
-
-
-
-print("Saved plots in /plots/")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace statistics and EDA plots")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--csv", default=CSV_FILE)
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--features-csv", default=None, help="also write split / file / label + columns")
+    parser.add_argument("--max-points", type=int, default=1_000_000,
+                        help="subsample size for the histogram and box-plot outliers")
+    parser.add_argument("--force", action="store_true", help="recompute the columns and every plot")
+    args = parser.parse_args()
+    run_analysis(args.store, args.csv, args.out_dir, args.cache_dir, args.features_csv,
+                 args.max_points, args.force)
@@ -1,78 +1,89 @@
 
+import atexit
+import importlib
+import os
+import threading
 import gradio as gr
-import pandas as pd
-import numpy as np
-import joblib
-import matplotlib.pyplot as plt
+from instrumentation import instrument
 from pathlib import Path
 
 # --------------------------
-# Load data & models
+# Load models (lazily)
 # --------------------------
-df = pd.read_csv("adfa_parsed.csv")
-pipeline = joblib.load("unsup_iforest_pipeline.pkl")
-rules = np.load("feature_rules.npy")  # feature-specific thresholds (optional)
+# The serving bundle (pipeline + baseline stats + rules, see serving_bundle.py) and
+# the heavy imports behind it (sklearn, pandas, matplotlib) are loaded on the first
+# detection, so the UI starts without them.
+_serving = {}
+_serving_lock = threading.Lock()
+# optional second models: name -> (artifact, module, class, training command)
+EXTRA_MODELS = {
+    "Markov": (os.environ.get("ADFA_MARKOV_MODEL", "markov_model.npz"),
+               "markov_detector", "MarkovDetector", "python markov_detector.py"),
+    "Nearest neighbour": (os.environ.get("ADFA_KNN_INDEX", "knn_index"),
+                          "knn_detector", "KNNDetector", "python knn_detector.py"),
+}
+MODELS = ["IsolationForest", *EXTRA_MODELS]
 
-# --------------------------
-# Feature extraction
-# --------------------------
-def make_numeric_features(texts):
-    X = pd.DataFrame()
-    X["length"] = texts.apply(lambda x: len(str(x).split()))
-    X["unique_calls"] = texts.apply(lambda x: len(set(str(x).split())))
-    X["mean_call_log"] = texts.apply(lambda x: np.log1p(np.mean([int(t) for t in str(x).split() if t.isdigit()])))
-    return X
+
+def serving():
+    if not _serving:
+        with _serving_lock:
+            if not _serving:
+                from compiled_forest import compile_pipeline
+                from detector import Detector, FeatureChart
+                from baseline_stats import file_fingerprint
+                from score_cache import ScoreCache, artifact_key
+                from serving_bundle import BUNDLE_FILE, load_serving
+
+                bundle = load_serving()
+                # results of earlier runs are reused only if model, rules and cascade mode are
+                # unchanged (no pass-rule cascade here); bundles written before model_sha256 was
+                # recorded are keyed on the bundle file itself
+                model_sha256 = bundle.get("model_sha256") or file_fingerprint(BUNDLE_FILE)["sha256"]
+                cache = ScoreCache(path=os.environ.get("ADFA_SCORE_CACHE"),
+                                   model_key=artifact_key(model_sha256, bundle["rules"], False))
+                if cache.path is not None:
+                    atexit.register(cache.save)
+                _serving["chart"] = FeatureChart(bundle["baseline"])
+                # array-backed forest: much lower per-call overhead for single traces
+                model = compile_pipeline(bundle["pipeline"])
+                _serving["detector"] = Detector(model, bundle["baseline"], bundle["rules"], cache=cache)
+                # optional second models, if they were trained
+                for name, (path, module, cls, _) in EXTRA_MODELS.items():
+                    if os.path.exists(path):
+                        _serving[name] = getattr(importlib.import_module(module), cls).load(path)
+    return _serving
 
 # --------------------------
 # Detection function
 # --------------------------
-def detect_log(text):
-    df_text = pd.DataFrame({"text": [text]})
-    X_feat = make_numeric_features(df_text)
-
-    # ---------------------- Real-time plot ----------------------
-    fig, ax = plt.subplots(figsize=(6,4))
-    features = ["length","unique_calls","mean_call_log"]
-    user_values = X_feat.iloc[0].values
-    normal_means = [
-        df["text"].apply(lambda x: len(str(x).split())).mean(),
-        df["text"].apply(lambda x: len(set(str(x).split()))).mean(),
-        np.log1p(df["text"].apply(lambda x: np.mean([int(t) for t in str(x).split() if t.isdigit()]))).mean()
-    ]
-    colors = ["blue" if user_values[i]<=normal_means[i]*1.5 else "red" for i in range(len(features))]
-
-    ax.bar(features, user_values, color=colors)
-    ax.plot(features, normal_means, "g--", label="Normal Avg")
-    ax.set_title("Features for Input Log")
-    ax.legend()
-    plt.tight_layout()
-    fig_path = "input_log_features.png"
-    fig.savefig(fig_path)
-    plt.close(fig)
-
-    # ---------------------- Detection ----------------------
-    status = "✔️ Normal"
-    suggestions = []
-
-    if user_values[0] > normal_means[0]*2:
-        status = "❌ Suspicious (Feature rule: length)"
-        suggestions.append(f"Length > typical max ({int(normal_means[0])})")
-    if user_values[1] > normal_means[1]*2:
-        status = "❌ Suspicious (Feature rule: unique_calls)"
-        suggestions.append(f"Unique calls > typical max ({int(normal_means[1])})")
-    if user_values[2] > np.log1p(1000):
-        status = "❌ Suspicious (Feature rule: mean_call_log)"
-        suggestions.append("Mean syscall ID too high")
-
-    pred = pipeline.predict(X_feat)[0]  # 1 = normal, -1 = anomaly
-    if pred == -1:
-        status = "⚠️ Suspicious (IsolationForest)"
-        suggestions.append("IsolationForest flagged anomaly")
+@instrument("detect_log")
+def detect_log(text, model="IsolationForest"):
+    """Prediction text only; the chart is rendered afterwards by render_log"""
+    s = serving()
+    try:
+        if model in EXTRA_MODELS:
+            if model not in s:
+                path, _, _, command = EXTRA_MODELS[model]
+                return f"{model} model not found ({path}); train it with: {command}"
+            return s[model].detect(text)["status"]
+        return s["detector"].detect(text)["status"]
+    except ValueError as exc:  # e.g. a syscall ID out of range
+        return f"❌ Invalid trace: {exc}"
 
-    if suggestions:
-        status += "\nSuggestions:\n" + "\n".join(suggestions)
 
-    return status, fig_path
+@instrument("render_log")
+def render_log(text, model="IsolationForest"):
+    # the chart explains the IsolationForest's summary features; the sequence models
+    # have no chart (an IsolationForest verdict there could contradict their status)
+    if model in EXTRA_MODELS:
+        return None
+    # detection results are cached by trace hash, so this does not re-score
+    s = serving()
+    try:
+        return s["chart"].render(s["detector"].detect(text))
+    except ValueError:  # reported by detect_log
+        return None
 
 # --------------------------
 # Load static visualizations
@@ -396,6 +407,7 @@ with gr.Blocks(title="ADFA Unsupervised Dashboard", css=css_style) as demo:
 
     with gr.Tab("🕵️ Real-time Detection"):
         input_txt = gr.Textbox(label="Paste Log", placeholder="Paste a log sequence here")
+        model_choice = gr.Radio(MODELS, value=MODELS[0], label="Model")
         output_lbl = gr.Textbox(label="Prediction")
         detect_btn = gr.Button("Detect")
         detect_img = gr.Image()
@@ -408,8 +420,12 @@ with gr.Blocks(title="ADFA Unsupervised Dashboard", css=css_style) as demo:
 
         detect_btn.click(
             detect_log,
-            inputs=input_txt,
-            outputs=[output_lbl, detect_img]
+            inputs=[input_txt, model_choice],
+            outputs=output_lbl
+        ).then(
+            render_log,
+            inputs=[input_txt, model_choice],
+            outputs=detect_img
         )
 
     # -------------------------- Footer note --------------------------
@@ -417,4 +433,5 @@ with gr.Blocks(title="ADFA Unsupervised Dashboard", css=css_style) as demo:
         "<p style='color:#ff6b6b; font-style:italic; text-align:center;'>⚠️ Note: The unsupervised model may occasionally make mistakes, especially on unusual log sequences.</p>"
     )
 
-demo.launch()
+if __name__ == "__main__":
+    demo.launch()
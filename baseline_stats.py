@@ -0,0 +1,133 @@
+# baseline_stats.py
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from feature_cache import load_features
+from trace_store import data_source
+
+STATS_FILE = "baseline_stats.json"
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# --------------------------
+# Source fingerprints
+# --------------------------
+def file_fingerprint(path, with_hash=True):
+    """Size / mtime / sha256 of a file, used to detect stale artifacts"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    st = path.stat()
+    fp = {"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        fp["sha256"] = h.hexdigest()
+    return fp
+
+
+def fingerprint_changed(stored, path):
+    """True if the file at `path` no longer matches the stored fingerprint"""
+    current = file_fingerprint(path, with_hash=False)
+    if stored is None or current is None:
+        return stored != current
+    if (current["size"], current["mtime_ns"]) == (stored["size"], stored["mtime_ns"]):
+        return False
+    # mtime moved (copy / touch) -> fall back to the content hash
+    if current["size"] != stored["size"]:
+        return True
+    return file_fingerprint(path)["sha256"] != stored.get("sha256")
+
+# --------------------------
+# Compute / save / load
+# --------------------------
+def compute_baseline_stats(X, split="training"):
+    """Per-feature mean, std, min/max and quantiles of a feature frame"""
+    features = {}
+    for col in X.columns:
+        values = np.asarray(X[col], dtype=float)
+        values = values[np.isfinite(values)]
+        features[col] = {
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "quantiles": {str(q): float(v) for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))},
+        }
+    return {
+        "split": split,
+        "n_samples": int(len(X)),
+        "features": features,
+    }
+
+
+def save_baseline_stats(stats, data_path=None, model_path=MODEL_FILE, out_path=STATS_FILE):
+    stats = dict(stats)
+    stats["created"] = datetime.now(timezone.utc).isoformat()
+    stats["sources"] = {
+        "data": file_fingerprint(data_path or data_source()),
+        "model": file_fingerprint(model_path),
+    }
+    Path(out_path).write_text(json.dumps(stats, indent=2))
+    print(f"Baseline stats saved → {out_path}")
+    return stats
+
+
+def load_baseline_stats(path=STATS_FILE):
+    return json.loads(Path(path).read_text())
+
+
+def stale_sources(stats, data_path=None, model_path=MODEL_FILE):
+    """Names of the sources that changed since the stats were built"""
+    sources = stats.get("sources", {})
+    stale = []
+    if fingerprint_changed(sources.get("data"), data_path or data_source()):
+        stale.append("data")
+    if fingerprint_changed(sources.get("model"), model_path):
+        stale.append("model")
+    return stale
+
+
+def feature_means(stats, features):
+    return [stats["features"][f]["mean"] for f in features]
+
+# --------------------------
+# Rebuild from the trace store / CSV (without retraining)
+# --------------------------
+def rebuild(model_path=MODEL_FILE, out_path=STATS_FILE):
+    X_train = load_features("training")
+    stats = compute_baseline_stats(X_train)
+    return save_baseline_stats(stats, None, model_path, out_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the baseline statistics artifact")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--out", default=STATS_FILE)
+    parser.add_argument("--check", action="store_true", help="only report whether the artifact is stale")
+    args = parser.parse_args()
+
+    if args.check:
+        if not os.path.exists(args.out):
+            print(f"{args.out} missing")
+            raise SystemExit(1)
+        stale = stale_sources(load_baseline_stats(args.out), None, args.model)
+        if stale:
+            print(f"{args.out} is stale (changed: {', '.join(stale)})")
+            raise SystemExit(1)
+        print(f"{args.out} is up to date")
+        return
+
+    rebuild(args.model, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# batch_score.py
+# Score a large set of traces with the IsolationForest pipeline in chunks.
+#
+#   python batch_score.py adfa_store        --out scores.csv
+#   python batch_score.py adfa_parsed.csv   --chunk-size 20000 --n-jobs 8
+#   python batch_score.py captures/2025-11-17/
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from baseline_stats import STATS_FILE, file_fingerprint, load_baseline_stats
+from cascade import CascadeStats, cascade_score
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays, take_traces, tokenize
+from instrumentation import instrument
+from ingest import SPLITS, iter_trace_files, read_trace
+from parallel_score import ProcessScorer
+from rules import RULES_FILE, evaluate_rules, hit_columns, load_rules
+from score_cache import ScoreCache, artifact_key, trace_keys
+from trace_store import TraceStore, has_store
+
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+DEFAULT_CHUNK_SIZE = 10_000
+
+# --------------------------
+# Input sources -> (meta frame, calls, offsets) chunks
+# --------------------------
+def iter_store_chunks(path, chunk_size):
+    ts = TraceStore(path)
+    for start in range(0, len(ts), chunk_size):
+        idx = np.arange(start, min(start + chunk_size, len(ts)))
+        calls, offsets = ts.select(idx)
+        yield ts.frame(idx).reset_index(drop=True), calls, offsets
+
+
+def iter_csv_chunks(path, chunk_size):
+    for df in pd.read_csv(path, chunksize=chunk_size):
+        calls, offsets = tokenize(df["text"])
+        yield df.drop(columns="text").reset_index(drop=True), calls, offsets
+
+
+def iter_dir_chunks(path, chunk_size, workers=8):
+    path = Path(path)
+    if any((path / d).exists() for d, _, _ in SPLITS):
+        files = iter_trace_files(path)
+    else:
+        # plain directory of captures: no split / label information
+        files = ((path.name, -1, Path(root) / f)
+                 for root, _, fs in sorted(os.walk(path)) for f in sorted(fs))
+
+    def to_chunk(batch):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            recs = list(pool.map(lambda a: read_trace(*a), batch))
+        lengths = np.array([len(r["calls"]) for r in recs], dtype=np.int64)
+        offsets = np.zeros(len(recs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        calls = np.concatenate([r["calls"] for r in recs]) if recs else np.zeros(0, dtype=np.int64)
+        meta = pd.DataFrame({k: [r[k] for r in recs] for k in ("split", "file", "label")})
+        return meta, calls, offsets
+
+    batch = []
+    for item in files:
+        batch.append(item)
+        if len(batch) >= chunk_size:
+            yield to_chunk(batch)
+            batch = []
+    if batch:
+        yield to_chunk(batch)
+
+
+def iter_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    source = Path(source)
+    if source.is_dir() and has_store(source):
+        return iter_store_chunks(source, chunk_size)
+    if source.is_dir():
+        return iter_dir_chunks(source, chunk_size)
+    return iter_csv_chunks(source, chunk_size)
+
+# --------------------------
+# Scoring
+# --------------------------
+def _score_arrays(pipeline, rules, calls, offsets, cascade_stats=None):
+    X = features_from_arrays(calls, offsets)
+    if cascade_stats is not None:
+        pred, scores, hits, decided_by = cascade_score(X, rules, pipeline, cascade_stats)
+    else:
+        hits = evaluate_rules(X, rules)
+        scores = pipeline.decision_function(X)  # < 0 = anomaly
+        pred = np.where(scores < 0, -1, 1)  # same convention as pipeline.predict
+        decided_by = None
+    return X, hits, scores, pred, decided_by
+
+
+def _score_cached(pipeline, rules, calls, offsets, cascade_stats, cache):
+    # one tuple per distinct trace: (*features, hits, score, pred, decided_by)
+    def compute(idx):
+        X, hits, scores, pred, decided_by = _score_arrays(pipeline, rules, *take_traces(calls, offsets, idx),
+                                                          cascade_stats)
+        if decided_by is None:
+            decided_by = [None] * len(idx)
+        return list(zip(*(X[c].tolist() for c in X.columns), hits.tolist(), scores.tolist(),
+                        pred.tolist(), list(decided_by)))
+
+    rows = cache.map(trace_keys(calls, offsets), compute)
+    n_feat = len(FEATURE_COLUMNS)
+    cols = list(zip(*rows)) if rows else [[]] * (n_feat + 4)
+    X = pd.DataFrame(dict(zip(FEATURE_COLUMNS, cols[:n_feat])))  # python ints stay int64
+    hits = np.asarray(cols[n_feat], dtype=np.uint32)
+    scores = np.asarray(cols[n_feat + 1], dtype=np.float64)
+    pred = np.asarray(cols[n_feat + 2], dtype=np.int64)
+    decided_by = None if cascade_stats is None else np.asarray(cols[n_feat + 3], dtype=object)
+    return X, hits, scores, pred, decided_by
+
+
+@instrument("score_chunk", rows=len)
+def score_chunk(pipeline, rules, meta, calls, offsets, cascade_stats=None, cache=None):
+    if cache is not None:
+        X, hits, scores, pred, decided_by = _score_cached(pipeline, rules, calls, offsets, cascade_stats, cache)
+    else:
+        X, hits, scores, pred, decided_by = _score_arrays(pipeline, rules, calls, offsets, cascade_stats)
+    out = pd.concat([meta, X], axis=1)
+    for name, col in hit_columns(hits, rules).items():
+        out[f"rule_{name}"] = col
+    out["rule_hits"] = hits
+    out["score"] = scores
+    out["pred"] = pred
+    if decided_by is not None:
+        out["decided_by"] = decided_by
+    return out
+
+
+def score_batch(source, out_path="scores.csv", model_path=MODEL_FILE, stats_path=STATS_FILE,
+                chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=1, backend="thread", rules_path=RULES_FILE,
+                cascade=False, cache_path=None, cache_size=1_000_000, verbose=True):
+    """Score every trace in `source` and write one row per trace to out_path.
+
+    backend="thread" scores up to n_jobs chunks concurrently in threads;
+    backend="process" scores one chunk at a time, sharded across n_jobs
+    worker processes (see parallel_score.py). With cascade=True the rules
+    decide trivially suspicious / normal traces and only the rest reach
+    the model (see cascade.py). With cache_path, results are memoized per
+    distinct trace and persisted there for later runs with the same model
+    and rules (see score_cache.py).
+    """
+    # baseline stats are only needed to learn default rules when there is no rules file
+    stats = None if Path(rules_path).exists() else load_baseline_stats(stats_path)
+    rules = load_rules(rules_path, stats=stats)
+    cache = None
+    if cache_path:
+        model_key = artifact_key(file_fingerprint(model_path)["sha256"], rules, cascade)
+        cache = ScoreCache(cache_size, cache_path, model_key)
+    if backend == "process":
+        scorer = ProcessScorer(model_path, n_jobs, max_rows=chunk_size)
+        scorer.warm_up()
+        pipeline, n_threads = scorer, 1
+    else:
+        scorer = None
+        pipeline, n_threads = joblib.load(model_path), max(n_jobs, 1)
+
+    cascade_stats = CascadeStats() if cascade else None
+    start = time.perf_counter()
+    n = n_anom = 0
+    header = True
+
+    def write(out):
+        nonlocal n, n_anom, header
+        out.to_csv(out_path, mode="w" if header else "a", header=header, index=False)
+        header = False
+        n += len(out)
+        n_anom += int((out["pred"] == -1).sum())
+        if verbose:
+            el = time.perf_counter() - start
+            print(f"{n:,} traces scored | {n / el:,.0f} traces/s")
+
+    # Tree traversal in sklearn releases the GIL, so chunks can be scored by threads.
+    try:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            pending = deque()
+            for meta, calls, offsets in iter_chunks(source, chunk_size):
+                pending.append(pool.submit(score_chunk, pipeline, rules, meta, calls, offsets, cascade_stats, cache))
+                if len(pending) > n_threads:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    finally:
+        if scorer is not None:
+            scorer.close()
+
+    elapsed = time.perf_counter() - start
+    if verbose:
+        print(f"Scored {n:,} traces in {elapsed:.2f}s ({n / max(elapsed, 1e-9):,.0f} traces/s), "
+              f"{n_anom:,} flagged → {out_path}")
+        if cascade_stats is not None:
+            print(cascade_stats.report())
+        if cache is not None:
+            c = cache.stats()
+            print(f"score cache: {c['hits']:,} hits, {c['misses']:,} misses ({c['hit_rate']:.1%}), "
+                  f"{c['size']:,} entries → {cache_path}")
+    if cache is not None:
+        cache.save()
+    result = {"traces": n, "anomalies": n_anom, "seconds": elapsed}
+    if cascade_stats is not None:
+        result["cascade"] = {"counts": cascade_stats.counts, "seconds": cascade_stats.seconds}
+    if cache is not None:
+        result["cache"] = cache.stats()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch scoring with the IsolationForest pipeline")
+    parser.add_argument("source", help="trace store directory, adfa_parsed.csv-style CSV, or directory of trace files")
+    parser.add_argument("--out", default="scores.csv")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--stats", default=STATS_FILE)
+    parser.add_argument("--rules", default=RULES_FILE)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--backend", choices=["thread", "process"], default="thread")
+    parser.add_argument("--cascade", action="store_true", help="let the rules short-circuit the model")
+    parser.add_argument("--cache", default=None, help="score cache file, reused across runs with the same model")
+    parser.add_argument("--cache-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+    score_batch(args.source, args.out, args.model, args.stats, args.chunk_size, args.n_jobs,
+                args.backend, args.rules, args.cascade, args.cache, args.cache_size)
@@ -0,0 +1,68 @@
+# benchmarks/bench_compiled_forest.py
+# Compiled array-backed forest vs. sklearn Pipeline.decision_function:
+# single-trace latency and batch throughput.
+#
+#   python benchmarks/bench_compiled_forest.py --sizes 1 16 256 4096 65536
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compiled_forest import CompiledForest
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays
+from trace_store import load_split
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="unsup_iforest_pipeline.pkl")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 256, 4096, 65536])
+    parser.add_argument("--single", type=int, default=200, help="single-trace calls for the latency percentiles")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    compiled = CompiledForest.from_pipeline(pipeline)
+    calls, offsets, _ = load_split(["validation", "attack"])
+    X_all = features_from_arrays(calls, offsets)
+
+    diff = np.abs(compiled.decision_function(X_all) - pipeline.decision_function(X_all)).max()
+    print(f"max |compiled - sklearn| on {len(X_all):,} traces: {diff:.3g}\n")
+
+    # per-trace latency: one DataFrame row per call, as in detect_log
+    rows = [X_all.iloc[[i % len(X_all)]] for i in range(args.single)]
+    print(f"{'single trace':<14}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, model in (("sklearn", pipeline), ("compiled", compiled)):
+        lat = []
+        for r in rows:
+            t0 = time.perf_counter()
+            model.decision_function(r)
+            lat.append(time.perf_counter() - t0)
+        lat = np.array(lat) * 1e3
+        print(f"{name:<14}{np.percentile(lat, 50):>10.3f}{np.percentile(lat, 99):>10.3f}")
+
+    print(f"\n{'batch':>8}{'sklearn/s':>14}{'compiled/s':>14}{'speedup':>10}")
+    for size in args.sizes:
+        idx = np.arange(size) % len(X_all)
+        X = pd.DataFrame(X_all.to_numpy()[idx], columns=FEATURE_COLUMNS)
+        t_sk = best_of(lambda: pipeline.decision_function(X), args.repeat)
+        t_c = best_of(lambda: compiled.decision_function(X), args.repeat)
+        print(f"{size:>8,}{size / t_sk:>14,.0f}{size / t_c:>14,.0f}{t_sk / t_c:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
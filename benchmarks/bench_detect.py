@@ -0,0 +1,87 @@
+# benchmarks/bench_detect.py
+# Per-request latency of the dashboard path: detect only vs. detect + render,
+# against the old figure-per-request + PNG-on-disk rendering.
+#
+#   python benchmarks/bench_detect.py --n 200
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from baseline_stats import STATS_FILE, feature_means, load_baseline_stats
+from detector import Detector, FeatureChart
+from feature_extraction import FEATURE_COLUMNS
+from rules import load_rules
+from trace_store import load_dataframe
+
+
+def render_png(result, means, path):
+    """Previous approach: new pyplot figure, tight_layout, savefig to a file"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    values = [result["features"][f] for f in FEATURE_COLUMNS]
+    colors = ["blue" if v <= m * 1.5 else "red" for v, m in zip(values, means)]
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.bar(FEATURE_COLUMNS, values, color=colors)
+    ax.plot(FEATURE_COLUMNS, means, "g--", label="Normal Avg")
+    ax.set_title("Features for Input Log")
+    ax.legend()
+    plt.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def timed(fn, texts):
+    lat = []
+    for t in texts:
+        t0 = time.perf_counter()
+        fn(t)
+        lat.append(time.perf_counter() - t0)
+    lat = np.array(lat) * 1e3
+    return np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="unsup_iforest_pipeline.pkl")
+    parser.add_argument("--n", type=int, default=200, help="number of distinct traces")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    baseline = load_baseline_stats(STATS_FILE)
+    rules = load_rules(stats=baseline)
+    texts = load_dataframe()["text"].sample(args.n, random_state=0).tolist()
+    means = feature_means(baseline, FEATURE_COLUMNS)
+    png = os.path.join(tempfile.mkdtemp(), "input_log_features.png")
+
+    def fresh():
+        return Detector(pipeline, baseline, rules, cache_size=0), FeatureChart(baseline, cache_size=0)
+
+    det, chart = fresh()
+    chart.render(det.detect(texts[0]))  # build the reusable figure once
+    cases = {
+        "detect only": lambda t: det.detect(t),
+        "detect + render (reused canvas)": lambda t: chart.render(det.detect(t)),
+        "detect + render (new figure + PNG)": lambda t: render_png(det.detect(t), means, png),
+    }
+    cached_det, cached_chart = Detector(pipeline, baseline, rules), FeatureChart(baseline)
+    for t in texts:
+        cached_chart.render(cached_det.detect(t))
+    cases["detect + render (cache hit)"] = lambda t: cached_chart.render(cached_det.detect(t))
+
+    print(f"{'path':<38}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, fn in cases.items():
+        p50, p99 = timed(fn, texts)
+        print(f"{name:<38}{p50:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_features.py
+# Throughput of the vectorized feature extractor vs the old per-row apply code.
+#
+#   python benchmarks/bench_features.py --csv adfa_parsed.csv --repeat 3
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from feature_extraction import make_numeric_features
+
+
+def apply_features(df):
+    """Reference: the apply-based extractor previously copied into train/app"""
+    X = pd.DataFrame()
+    X["length"] = df["text"].apply(lambda x: len(str(x).split()))
+    X["unique_calls"] = df["text"].apply(lambda x: len(set(str(x).split())))
+    X["mean_call_log"] = df["text"].apply(lambda x: np.log1p(np.mean([int(t) for t in str(x).split() if t.isdigit()])))
+    return X
+
+
+def best_of(fn, df, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(df)
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="adfa_parsed.csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=1, help="replicate the corpus N times")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    if args.scale > 1:
+        df = pd.concat([df] * args.scale, ignore_index=True)
+    n = len(df)
+    print(f"Traces: {n}")
+
+    t_old, X_old = best_of(apply_features, df, args.repeat)
+    t_new, X_new = best_of(make_numeric_features, df, args.repeat)
+
+    # empty traces are NaN in the old code and 0 in the new one
+    both = np.isfinite(X_old.values).all(axis=1)
+    assert np.allclose(X_old.values[both], X_new.values[both]), "feature mismatch"
+
+    print(f"apply-based : {t_old:8.3f}s  {n / t_old:12,.0f} traces/sec")
+    print(f"vectorized  : {t_new:8.3f}s  {n / t_new:12,.0f} traces/sec")
+    print(f"speedup     : {t_old / t_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_parallel_scoring.py
+# Scaling curve of process-pool IsolationForest scoring vs. single-process sklearn.
+#
+#   python benchmarks/bench_parallel_scoring.py --splits validation attack --scale 20
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from feature_extraction import features_from_arrays
+from parallel_score import ProcessScorer
+from trace_store import load_split
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="unsup_iforest_pipeline.pkl")
+    parser.add_argument("--splits", nargs="+", default=["validation", "attack"])
+    parser.add_argument("--scale", type=int, default=10, help="replicate the feature rows N times")
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    calls, offsets, _ = load_split(args.splits)
+    X = features_from_arrays(calls, offsets)
+    X = pd.concat([X] * args.scale, ignore_index=True)
+    n = len(X)
+    print(f"Rows: {n:,} ({args.scale}x {', '.join(args.splits)})")
+
+    pipeline = joblib.load(args.model)
+    pipeline.steps[-1][1].set_params(n_jobs=1)
+    t_ref = min(_timed(lambda: pipeline.decision_function(X)) for _ in range(args.repeat))
+    ref = pipeline.decision_function(X)
+    print(f"{'sklearn':>10} : {t_ref:7.3f}s  {n / t_ref:12,.0f} rows/s")
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1, 2, 4, 8, 16, 32, cpus} & set(range(1, cpus + 1)))
+    print(f"{'workers':>10}   {'time':>7}   {'rows/s':>12}   {'speedup':>7}   {'efficiency':>10}")
+    for w in workers:
+        with ProcessScorer(args.model, w, max_rows=n, n_features=X.shape[1]) as scorer:
+            scorer.warm_up()
+            t = min(_timed(lambda: scorer.decision_function(X)) for _ in range(args.repeat))
+            assert np.allclose(scorer.decision_function(X), ref), "scores differ from sklearn"
+        print(f"{w:>10}   {t:6.3f}s   {n / t:12,.0f}   {t_ref / t:6.2f}x   {t_ref / t / w:9.0%}")
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    main()
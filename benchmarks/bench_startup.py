@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py
+# Cold-start time and peak RSS of app.py: serving bundle vs. separate artifacts.
+#
+# Each measurement runs in a fresh interpreter:
+#   import gradio -> import app (UI ready) -> first detection (artifacts loaded) -> second detection
+#
+#   python benchmarks/bench_startup.py --repeat 3
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+t0 = time.perf_counter()
+import gradio
+t1 = time.perf_counter(); r1 = rss_mb()
+import app
+t2 = time.perf_counter(); r2 = rss_mb()
+app.detect_log("6 6 63 6 42 120 6 195 120 6 6 114 114 1 1 252 252 252 1 1")
+t3 = time.perf_counter(); r3 = rss_mb()
+app.detect_log("6 6 63 6 42 120 6 195 120 6 6 114 114 1 1 252 252 252 1 1 1")
+t4 = time.perf_counter()
+print(json.dumps({{"import_gradio_s": t1 - t0, "import_app_s": t2 - t1, "first_detect_s": t3 - t2,
+                  "second_detect_ms": (t4 - t3) * 1e3, "rss_ui_mb": r2, "rss_peak_mb": r3}}))
+"""
+
+
+def probe(bundle_path):
+    env = dict(os.environ, ADFA_SERVING_BUNDLE=bundle_path, GRADIO_ANALYTICS_ENABLED="False")
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", PROBE.format(root=str(ROOT))],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bundle", default="serving_bundle.joblib")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    modes = {"bundle": args.bundle, "separate artifacts": "__no_bundle__.joblib"}
+    if not Path(args.bundle).exists():
+        print(f"{args.bundle} not found; build it with `python serving_bundle.py`")
+        modes.pop("bundle")
+
+    keys = ["import_gradio_s", "import_app_s", "first_detect_s", "second_detect_ms", "rss_ui_mb", "rss_peak_mb"]
+    print(f"{'mode':<20}" + "".join(f"{k:>18}" for k in keys))
+    for name, path in modes.items():
+        runs = [probe(path) for _ in range(args.repeat)]
+        med = {k: float(np.median([r[k] for r in runs])) for k in keys}
+        print(f"{name:<20}" + "".join(f"{med[k]:>18.3f}" for k in keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/load_generator.py
+# Replay ADFA-LD traces against scoring_server.py from many concurrent clients.
+#
+#   python scoring_server.py --port 8080 &
+#   python benchmarks/load_generator.py --port 8080 --concurrency 64 --requests 5000
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from trace_store import CSV_FILE, STORE_DIR, load_dataframe
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: scorer\r\n"
+                  "Content-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def _client(args, texts, next_index, latencies, errors):
+    reader, writer = await _connect(args)
+    try:
+        while True:
+            i = next(next_index, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            status, _ = await _request(reader, writer, "POST", "/score", {"trace": texts[i % len(texts)]})
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args, texts):
+    latencies, errors = [], []
+    next_index = iter(range(args.requests))
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(args, texts, next_index, latencies, errors) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await _connect(args)
+    _, server_metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+
+    lat = np.array(latencies) * 1e3
+    print(f"requests: {len(latencies):,}  concurrency: {args.concurrency}  errors: {len(errors)}")
+    print(f"client  : {len(latencies) / elapsed:,.0f} req/s | "
+          f"p50 {np.percentile(lat, 50):.2f} ms | p99 {np.percentile(lat, 99):.2f} ms | max {lat.max():.2f} ms")
+    print("server  : " + json.dumps(server_metrics))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for scoring_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--store", default=STORE_DIR, help="trace source (falls back to --csv)")
+    parser.add_argument("--csv", default=CSV_FILE)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = load_dataframe(args.store, args.csv)["text"].tolist()
+    asyncio.run(run(args, texts))
+
+
+if __name__ == "__main__":
+    main()
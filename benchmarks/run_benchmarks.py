@@ -0,0 +1,241 @@
+# benchmarks/run_benchmarks.py
+# End-to-end benchmark suite: ingest, feature extractors, training, evaluation and
+# dashboard detection on ADFA-LD and on synthetically scaled corpora.
+#
+# Scaled corpora (10x, 100x, ...) are generated by resampling trace files with
+# replacement into the same folder layout (hard links where possible). Every stage
+# runs in a fresh interpreter, so the peak RSS reported is that stage's own.
+#
+#   python benchmarks/run_benchmarks.py ADFA-LD --scales 1 10 --out bench_results.json
+#   python benchmarks/run_benchmarks.py ADFA-LD --save-baseline          # record benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py ADFA-LD --baseline benchmarks/baseline.json   # exit 1 on regression
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from ingest import SPLITS, iter_trace_files
+
+BASELINE_FILE = ROOT / "benchmarks" / "baseline.json"
+
+# Each stage is a snippet run in the corpus work dir; it must set `n` (items processed).
+STAGES = {
+    "ingest": """
+from prepare_data import prepare_adfa
+stats = prepare_adfa(CORPUS, out_store="adfa_store", out_csv="adfa_parsed.csv", full=True)
+from trace_store import TraceStore
+n = len(TraceStore("adfa_store"))
+""",
+    "features_store": """
+from trace_store import load_split
+from feature_extraction import features_from_arrays
+calls, offsets, meta = load_split()
+X = features_from_arrays(calls, offsets)
+n = len(X)
+""",
+    "features_text": """
+import pandas as pd
+from feature_extraction import make_numeric_features
+df = pd.read_csv("adfa_parsed.csv")
+X = make_numeric_features(df)
+n = len(X)
+""",
+    "features_ngram": """
+from trace_store import load_split
+from ngram_features import NgramFeaturizer
+calls, offsets, meta = load_split()
+M = NgramFeaturizer(n_max=3).fit_transform((calls, offsets))
+n = M.shape[0]
+""",
+    "train": """
+from train_ExIso import train_unsupervised
+from trace_store import load_split
+train_unsupervised()
+n = len(load_split("training")[2])
+""",
+    "evaluate": """
+from evaluate_unsupervised import evaluate
+from trace_store import load_split
+evaluate()
+n = len(load_split(["validation", "attack"])[2])
+""",
+    "detect": """
+import pandas as pd
+import app
+texts = pd.read_csv("adfa_parsed.csv")["text"].drop_duplicates().head(DETECT_N).tolist()
+app.detect_log(texts[0])  # loads the serving bundle
+t0 = time.perf_counter()  # per-trace latency excludes the one-time load
+for t in texts:
+    app.detect_log(t)
+n = len(texts)
+""",
+}
+
+# stages whose outputs (trace store / CSV, trained artifacts) a stage needs in its work dir
+REQUIRES = {
+    "features_store": ["ingest"], "features_text": ["ingest"], "features_ngram": ["ingest"],
+    "train": ["ingest"], "evaluate": ["ingest", "train"], "detect": ["ingest", "train"],
+}
+
+PROBE = r"""
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+CORPUS, DETECT_N = {corpus!r}, {detect_n!r}
+t0 = time.perf_counter()
+{code}
+seconds = time.perf_counter() - t0
+print("@@RESULT@@" + json.dumps({{"n": n, "seconds": seconds,
+      "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+# --------------------------
+# Corpora
+# --------------------------
+def build_scaled_corpus(base_dir, scale, out_dir, seed=0):
+    """Resample every split's trace files `scale` times into out_dir"""
+    base_dir, out_dir = Path(base_dir), Path(out_dir)
+    rng = np.random.default_rng(seed)
+    files = {}
+    for split, _, path in iter_trace_files(base_dir):
+        files.setdefault(split, []).append(path)
+    dirs = {split: d for d, split, _ in SPLITS}
+    for split, paths in files.items():
+        picks = rng.integers(0, len(paths), size=len(paths) * scale)
+        for i, p in enumerate(picks):
+            src = paths[p]
+            rel = src.relative_to(base_dir / dirs[split])
+            dst = out_dir / dirs[split] / rel.parent / f"{src.stem}_r{i}{src.suffix}"
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+    return out_dir
+
+# --------------------------
+# Running
+# --------------------------
+def run_stage(stage, corpus, work_dir, detect_n):
+    code = PROBE.format(root=str(ROOT), corpus=str(corpus), detect_n=detect_n, code=STAGES[stage])
+    env = dict(os.environ, GRADIO_ANALYTICS_ENABLED="False", ADFA_SERVING_BUNDLE="serving_bundle.joblib")
+    env.pop("ADFA_SCORE_CACHE", None)
+    proc = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=work_dir, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{proc.stderr[-2000:]}")
+    line = [l for l in proc.stdout.splitlines() if l.startswith("@@RESULT@@")][-1]
+    res = json.loads(line[len("@@RESULT@@"):])
+    res["throughput"] = res["n"] / max(res["seconds"], 1e-9)
+    return res
+
+
+def with_requirements(stages):
+    """Selected stages plus the ones they depend on, in suite order"""
+    wanted = set(stages)
+    for s in stages:
+        wanted.update(REQUIRES.get(s, []))
+    return [s for s in STAGES if s in wanted]
+
+
+def run_suite(base_dir, scales=(1, 10), stages=tuple(STAGES), detect_n=200, work_root=None, verbose=True):
+    results = []
+    stages = with_requirements(stages)
+    with tempfile.TemporaryDirectory(dir=work_root) as tmp:
+        for scale in scales:
+            work_dir = Path(tmp) / f"x{scale}"
+            work_dir.mkdir()
+            if scale == 1:
+                corpus = Path(base_dir).resolve()
+            else:
+                t0 = time.perf_counter()
+                corpus = build_scaled_corpus(base_dir, scale, work_dir / "corpus")
+                if verbose:
+                    print(f"[x{scale}] corpus generated in {time.perf_counter() - t0:.1f}s")
+            for stage in stages:
+                if stage == "detect" and scale != 1:
+                    continue  # per-trace latency does not depend on the corpus size
+                res = run_stage(stage, corpus, work_dir, detect_n)
+                res.update(stage=stage, scale=scale)
+                results.append(res)
+                if verbose:
+                    print(f"[x{scale}] {stage:<15} {res['seconds']:>9.3f}s {res['throughput']:>12,.0f} items/s "
+                          f"{res['peak_rss_mb']:>9.1f} MB  (n={res['n']:,})")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "commit": commit,
+            "created": datetime.now(timezone.utc).isoformat()}
+
+# --------------------------
+# Baseline comparison
+# --------------------------
+def compare(results, baseline, time_tol=0.25, mem_tol=0.25, min_seconds=0.05):
+    """Regressions vs. a baseline report: slower by more than time_tol or bigger by more than mem_tol.
+
+    Slowdowns under `min_seconds` in absolute terms are treated as noise.
+    """
+    ref = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = ref.get((r["stage"], r["scale"]))
+        if b is None:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + time_tol) and r["seconds"] - b["seconds"] > min_seconds:
+            regressions.append(f"{r['stage']} x{r['scale']}: {b['seconds']:.3f}s → {r['seconds']:.3f}s "
+                               f"({r['seconds'] / b['seconds'] - 1:+.0%})")
+        if r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + mem_tol):
+            regressions.append(f"{r['stage']} x{r['scale']}: {b['peak_rss_mb']:.0f} MB → {r['peak_rss_mb']:.0f} MB "
+                               f"({r['peak_rss_mb'] / b['peak_rss_mb'] - 1:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite")
+    parser.add_argument("base_dir", nargs="?", default="ADFA-LD")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--detect-n", type=int, default=200, help="distinct traces for the detect stage")
+    parser.add_argument("--work-dir", default=None, help="where scaled corpora and artifacts are generated")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the report to {BASELINE_FILE}")
+    parser.add_argument("--time-tol", type=float, default=0.25)
+    parser.add_argument("--mem-tol", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_suite(args.base_dir, args.scales, args.stages, args.detect_n, args.work_dir)
+    report = {"environment": environment(), "results": results}
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"Benchmark results saved → {args.out}")
+    if args.save_baseline:
+        BASELINE_FILE.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved → {BASELINE_FILE}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.time_tol, args.mem_tol)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            raise SystemExit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
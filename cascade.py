@@ -0,0 +1,79 @@
+# cascade.py
+# Rule pre-filter ahead of the IsolationForest.
+#
+#   stage 1: flag rules   any "flag" rule hit        -> anomaly, model skipped
+#   stage 2: pass rules   all "pass" rules hit       -> normal,  model skipped
+#   stage 3: model        everything else            -> pipeline.decision_function
+#
+# The pass stage is opt-in for bulk scoring (batch_score --cascade, scoring_server
+# --cascade); single-trace detection only lets the flag rules short-circuit.
+import threading
+import time
+
+import numpy as np
+
+from rules import action_mask, evaluate_rules
+
+DECIDED_BY = np.array(["rule_flag", "rule_pass", "model"], dtype=object)
+
+
+class CascadeStats:
+    """Per-stage trace counts and wall time, accumulated over batches"""
+
+    def __init__(self):
+        self.counts = {"total": 0, "rule_flag": 0, "rule_pass": 0, "model": 0}
+        self.seconds = {"rules": 0.0, "model": 0.0}
+        self._lock = threading.Lock()
+
+    def add(self, decided_by, t_rules, t_model):
+        with self._lock:
+            self._add(decided_by, t_rules, t_model)
+
+    def _add(self, decided_by, t_rules, t_model):
+        self.counts["total"] += len(decided_by)
+        for name in ("rule_flag", "rule_pass", "model"):
+            self.counts[name] += int(np.count_nonzero(decided_by == name))
+        self.seconds["rules"] += t_rules
+        self.seconds["model"] += t_model
+
+    def report(self):
+        c, s = self.counts, self.seconds
+        total = max(c["total"], 1)
+        return (f"cascade: {c['total']:,} traces | "
+                f"flagged by rules {c['rule_flag']:,} ({c['rule_flag'] / total:.1%}) | "
+                f"passed by rules {c['rule_pass']:,} ({c['rule_pass'] / total:.1%}) | "
+                f"model {c['model']:,} ({c['model'] / total:.1%}) | "
+                f"rules {s['rules']:.3f}s, model {s['model']:.3f}s")
+
+
+def cascade_score(X, rules, model, stats=None, pass_rules=True):
+    """Score a feature batch, calling the model only for undecided rows.
+
+    Returns (pred, scores, hits, decided_by): pred follows the predict
+    convention (1 normal / -1 anomaly), scores are decision_function values
+    (NaN where the rules decided), hits is the rule bitmask per row. With
+    pass_rules=False only the flag rules decide; every other row is scored.
+    """
+    t0 = time.perf_counter()
+    hits = evaluate_rules(X, rules)
+    flag_mask, pass_mask = action_mask(rules, "flag"), action_mask(rules, "pass")
+    flagged = (hits & flag_mask) != 0
+    if pass_rules and pass_mask:
+        passed = ~flagged & ((hits & pass_mask) == pass_mask)
+    else:
+        passed = np.zeros(len(hits), dtype=bool)
+    undecided = ~(flagged | passed)
+    t1 = time.perf_counter()
+
+    scores = np.full(len(hits), np.nan)
+    pred = np.where(flagged, -1, 1)
+    if undecided.any():
+        rows = X[undecided] if hasattr(X, "columns") else np.asarray(X)[undecided]
+        scores[undecided] = model.decision_function(rows)
+        pred[undecided] = np.where(scores[undecided] < 0, -1, 1)
+    t2 = time.perf_counter()
+
+    decided_by = DECIDED_BY[np.select([flagged, passed], [0, 1], 2)]
+    if stats is not None:
+        stats.add(decided_by, t1 - t0, t2 - t1)
+    return pred, scores, hits, decided_by
@@ -0,0 +1,17 @@
+# cli_params.py
+# argparse value types for IsolationForest parameters (shared by train_ExIso.py and sweep_iforest.py).
+
+
+def parse_param(value):
+    """CLI value: "auto", an int ("256") or a float ("0.5", "1e-2")"""
+    if value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_contamination(value):
+    """CLI contamination: "auto" or a float (IsolationForest rejects ints, so "1" -> 1.0)"""
+    return value if value == "auto" else float(value)
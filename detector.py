@@ -0,0 +1,124 @@
+# detector.py
+# Single-trace detection for the dashboard, kept separate from chart rendering.
+#
+# Detector.detect() returns a structured result right away; FeatureChart renders
+# the comparison bar chart on one reusable Agg canvas into an in-memory RGB array
+# (no pyplot state, no files on disk). Both are cached by a hash of the parsed
+# trace (score_cache.py), so repeated and example inputs are served without
+# recomputation.
+import threading
+
+import numpy as np
+
+from baseline_stats import feature_means
+from cascade import cascade_score
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays, tokenize
+from rules import describe, fired_rules
+from score_cache import LRUCache, ScoreCache, trace_key
+
+
+# --------------------------
+# Detection
+# --------------------------
+def format_status(result):
+    """Dashboard status text for a detection result"""
+    status = "✔️ Normal"
+    for name in result["rules"]:
+        status = f"❌ Suspicious (Feature rule: {name})"
+    if result["decided_by"] == "model" and result["pred"] == -1:  # 1 = normal, -1 = anomaly
+        status = "⚠️ Suspicious (IsolationForest)"
+    if result["suggestions"]:
+        status += "\nSuggestions:\n" + "\n".join(result["suggestions"])
+    return status
+
+
+class Detector:
+    """Features + flag rules + IsolationForest for one trace at a time.
+
+    A fired flag rule skips the model; every other trace gets a real
+    decision_function score. cascade=True also lets the pass rules declare
+    traces normal without the model (see cascade.py).
+    """
+
+    def __init__(self, pipeline, baseline, rules, cache_size=1024, cache=None, cascade=False):
+        self.pipeline = pipeline
+        self.baseline = baseline
+        self.rules = rules
+        self.cascade = cascade
+        self.cache = cache if cache is not None else ScoreCache(cache_size)
+
+    def detect(self, text):
+        calls, offsets = tokenize([text])
+        key = trace_key(calls)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        X = features_from_arrays(calls, offsets)
+        pred, scores, hits, decided_by = cascade_score(X, self.rules, self.pipeline, pass_rules=self.cascade)
+        fired = fired_rules(hits[0], self.rules)
+        suggestions = [describe(r) for r in fired]
+        if decided_by[0] == "model" and pred[0] == -1:
+            suggestions.append("IsolationForest flagged anomaly")
+        result = {
+            "key": key.hex(),
+            "features": {c: float(X[c].iat[0]) for c in FEATURE_COLUMNS},
+            "pred": int(pred[0]),
+            "score": None if np.isnan(scores[0]) else float(scores[0]),
+            "decided_by": decided_by[0],
+            "rules": [r["name"] for r in fired],
+            "suggestions": suggestions,
+        }
+        result["status"] = format_status(result)
+        self.cache.put(key, result)
+        return result
+
+# --------------------------
+# Rendering
+# --------------------------
+class FeatureChart:
+    """Input features vs. training means, drawn on one reusable figure"""
+
+    def __init__(self, baseline, features=FEATURE_COLUMNS, cache_size=256, figsize=(6, 4), dpi=100):
+        self.features = list(features)
+        self.means = feature_means(baseline, self.features)
+        self.figsize = figsize
+        self.dpi = dpi
+        self.cache = LRUCache(cache_size)
+        self._fig = None
+        self._lock = threading.Lock()
+
+    def _setup(self):
+        # created on first use; the Agg canvas does not touch pyplot's global state
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        self._canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        self._bars = ax.bar(self.features, np.zeros(len(self.features)))
+        ax.plot(self.features, self.means, "g--", label="Normal Avg")
+        ax.set_title("Features for Input Log")
+        ax.legend()
+        fig.tight_layout()
+        self._ax = ax
+        self._fig = fig
+
+    def render(self, result):
+        """RGB image (H, W, 3 uint8) of the chart for a detection result"""
+        image = self.cache.get(result["key"])
+        if image is not None:
+            return image
+        values = [result["features"][f] for f in self.features]
+        with self._lock:
+            if self._fig is None:
+                self._setup()
+            for bar, value, mean in zip(self._bars, values, self.means):
+                bar.set_height(value)
+                bar.set_color("blue" if value <= mean * 1.5 else "red")
+            self._ax.relim()
+            self._ax.autoscale_view()
+            self._canvas.draw()
+            image = np.asarray(self._canvas.buffer_rgba())[..., :3].copy()
+        self.cache.put(result["key"], image)
+        return image
@@ -1,23 +1,209 @@
 # evaluate_unsupervised.py
+# Evaluation engine for one or more trained detectors on the validation + attack splits.
+#
+# decision_function scores are computed once per (model artifact, dataset) and
+# cached in eval_cache/; every metric is then derived from the cached scores.
+# ROC / PR curves come from one descending sort of the anomaly scores and
+# cumulative sums of the labels (one point per distinct threshold), so AUC,
+# average precision, detection rate at a fixed FPR and the confusion matrices at
+# any threshold need no re-prediction.
+#
+#   python evaluate_unsupervised.py                                   # IsolationForest
+#   python evaluate_unsupervised.py --models iforest markov knn unsup_iforest_ngram_pipeline.pkl
+import argparse
+import json
+from pathlib import Path
+
 import joblib
+import numpy as np
 import pandas as pd
-from feature_extraction import make_numeric_features
 
-def evaluate():
-    df = pd.read_csv("adfa_parsed.csv")
-    df_test = df[df["split"].isin(["validation", "attack"])]
+import feature_extraction
+from baseline_stats import file_fingerprint
+from feature_cache import load_features, source_hash
+from knn_detector import KNN_DIR, KNNDetector
+from markov_detector import MARKOV_FILE, MarkovDetector
+from score_cache import artifact_key
+from trace_store import data_source, load_split
+
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+CACHE_DIR = "eval_cache"
+REPORT_FILE = "eval_report.json"
+SPLITS = ["validation", "attack"]
+FPR_TARGETS = [0.001, 0.01, 0.05]
+# short names for the standard artifacts; anything else is a path to a pickled pipeline
+MODELS = {"iforest": MODEL_FILE, "markov": MARKOV_FILE, "knn": KNN_DIR}
+OUTPUTS = {"iforest": "unsup_predictions.csv", "markov": "markov_predictions.csv", "knn": "knn_predictions.csv"}
+
+# --------------------------
+# Models and cached scores
+# --------------------------
+def load_model(path):
+    """(model, input kind): "features" for summary-feature pipelines, "arrays" for sequence models"""
+    path = Path(path)
+    if path.is_dir():
+        return KNNDetector.load(path), "arrays"
+    if path.suffix == ".npz":
+        return MarkovDetector.load(path), "arrays"
+    model = joblib.load(path)
+    # pipelines fitted on the feature frame know its columns; n-gram pipelines take (calls, offsets)
+    return model, "features" if hasattr(model, "feature_names_in_") else "arrays"
+
+
+def artifact_fingerprint(path):
+    """sha256 of a model file, or of every file of a model directory"""
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    return artifact_key(*[(p.name, file_fingerprint(p)["sha256"]) for p in files])
+
+
+def input_kind(path):
+    """load_model's input kind, where it is known without loading: None for pickled pipelines"""
+    path = Path(path)
+    return "arrays" if path.is_dir() or path.suffix == ".npz" else None
+
+
+def cached_scores(path, inputs, data_key, cache_dir=CACHE_DIR):
+    """decision_function of the model at `path` on the evaluation traces, computed once"""
+    # pickled pipelines may take the extracted features: their scores also depend on the extractor
+    extractor = source_hash(feature_extraction) if input_kind(path) is None else None
+    key = artifact_key(artifact_fingerprint(path), data_key, extractor)
+    fp = Path(cache_dir) / f"scores-{key}.npy"
+    if fp.exists():
+        return np.load(fp), True
+    model, kind = load_model(path)
+    scores = np.asarray(model.decision_function(inputs[kind]()), dtype=np.float64)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    np.save(fp, scores)
+    return scores, False
+
+# --------------------------
+# Metrics from one sort
+# --------------------------
+def threshold_curve(y, anomaly):
+    """(thresholds, tp, fp) for "anomaly >= threshold" at every distinct score, highest first"""
+    order = np.argsort(-anomaly, kind="stable")
+    s, y = anomaly[order], np.asarray(y)[order].astype(np.int64)
+    tp = np.cumsum(y)
+    fp = np.cumsum(1 - y)
+    # last position of each run of tied scores: all tied traces flip together
+    last = np.r_[np.flatnonzero(s[1:] != s[:-1]), len(s) - 1]
+    return s[last], tp[last], fp[last]
+
+
+def curve_metrics(y, anomaly, fpr_targets=FPR_TARGETS):
+    thresholds, tp, fp = threshold_curve(y, anomaly)
+    P, N = int(np.sum(y)), int(len(y) - np.sum(y))
+    tpr = np.r_[0.0, tp / P] if P else np.full(len(tp) + 1, np.nan)
+    fpr = np.r_[0.0, fp / N] if N else np.full(len(fp) + 1, np.nan)
+    precision = tp / (tp + fp)
+    metrics = {
+        "roc_auc": float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)) if P and N else float("nan"),
+        # step-wise average precision, as sklearn.metrics.average_precision_score
+        "average_precision": float(np.sum(np.diff(tpr) * precision)) if P else float("nan"),
+    }
+    for target in fpr_targets:
+        ok = fpr <= target
+        metrics[f"dr_at_fpr_{target:g}"] = float(tpr[ok].max()) if P and N else float("nan")
+    curves = {"thresholds": thresholds, "tpr": tpr[1:], "fpr": fpr[1:], "precision": precision}
+    return metrics, curves
+
+
+def confusion_by_split(meta, flagged):
+    """tn / fp / fn / tp per split (flagged = predicted anomaly)"""
+    df = pd.DataFrame({"split": meta["split"].to_numpy(), "label": meta["label"].to_numpy().astype(int),
+                       "flagged": np.asarray(flagged, dtype=int)})
+    out = {}
+    for split, g in df.groupby("split", sort=False):
+        cells = np.bincount(g["label"] * 2 + g["flagged"], minlength=4)
+        out[split] = dict(zip(["tn", "fp", "fn", "tp"], cells.tolist()))
+    return out
+
+
+def threshold_for_fpr(curves, target):
+    """Lowest anomaly-score threshold on the curve whose false-positive rate stays within target"""
+    ok = np.flatnonzero(curves["fpr"] <= target)
+    return float(curves["thresholds"][ok[-1]]) if len(ok) else float("inf")
+
+# --------------------------
+# Engine
+# --------------------------
+def evaluate(models=("iforest",), fpr_targets=FPR_TARGETS, cache_dir=CACHE_DIR, report_path=REPORT_FILE,
+             curves_path=None, verbose=True):
+    """Evaluate several model artifacts on the same cached inputs; returns the report dict"""
+    calls, offsets, meta = load_split(SPLITS)
+    y = meta["label"].to_numpy().astype(int)
+    data_key = artifact_key(file_fingerprint(data_source())["sha256"], SPLITS)
+    features = {}
+
+    def feature_frame():
+        # loaded from the feature cache at most once per run, and only if a model needs it
+        if "X" not in features:
+            features["X"] = load_features(SPLITS)
+        return features["X"]
+
+    inputs = {
+        "features": feature_frame,
+        "arrays": lambda: (calls, offsets),
+    }
+
+    report = {"n_traces": int(len(y)), "n_attacks": int(y.sum()), "models": {}}
+    curves_out = {}
+    for name in models:
+        path = MODELS.get(name, name)
+        scores, hit = cached_scores(path, inputs, data_key, cache_dir)
+        anomaly = -scores  # decision_function < 0 = anomaly, so higher = more anomalous
+        metrics, curves = curve_metrics(y, anomaly, fpr_targets)
+        flagged = scores < 0
+        metrics["detection_rate"] = float(flagged[y == 1].mean()) if (y == 1).any() else float("nan")
+        metrics["false_positive_rate"] = float(flagged[y == 0].mean()) if (y == 0).any() else float("nan")
+        entry = {"artifact": str(path), "cached": hit, "metrics": metrics,
+                 "confusion": confusion_by_split(meta, flagged), "confusion_at_fpr": {}}
+        for target in fpr_targets:
+            t = threshold_for_fpr(curves, target)
+            entry["confusion_at_fpr"][f"{target:g}"] = {"decision_threshold": -t,
+                                                        **confusion_by_split(meta, anomaly >= t)}
+        report["models"][name] = entry
+        curves_out.update({f"{name}/{k}": v for k, v in curves.items()})
 
-    X_test = make_numeric_features(df_test)
-    model = joblib.load("unsup_iforest.pkl")
+        if name in OUTPUTS:
+            preds = meta.copy()
+            preds["score"] = scores
+            preds["pred"] = flagged.astype(int)
+            preds.to_csv(OUTPUTS[name], index=False)
 
-    preds = model.predict(X_test)   # 1 = normal , -1 = anomaly
+    Path(report_path).write_text(json.dumps(report, indent=2))
+    if curves_path:
+        np.savez(curves_path, **curves_out)
+    if verbose:
+        print(format_report(report, fpr_targets))
+        print(f"Report saved → {report_path}")
+    return report
 
-    df_test["pred"] = (preds == -1).astype(int)
 
-    print(df_test.groupby(["split", "label", "pred"]).size())
-    df_test.to_csv("unsup_predictions.csv", index=False)
-    print("Saved → unsup_predictions.csv")
+def format_report(report, fpr_targets=FPR_TARGETS):
+    rows = []
+    for name, entry in report["models"].items():
+        m = entry["metrics"]
+        row = {"model": name, "ROC AUC": m["roc_auc"], "AP": m["average_precision"],
+               "DR": m["detection_rate"], "FPR": m["false_positive_rate"]}
+        row.update({f"DR@{t:g}": m[f"dr_at_fpr_{t:g}"] for t in fpr_targets})
+        rows.append(row)
+    lines = [pd.DataFrame(rows).set_index("model").round(4).to_string(), ""]
+    for name, entry in report["models"].items():
+        lines.append(f"{name} (decision_function < 0): " + "  ".join(
+            f"{split} {c}" for split, c in entry["confusion"].items()))
+    return "\n".join(lines)
 
 
 if __name__ == "__main__":
-    evaluate()
+    parser = argparse.ArgumentParser(description="Evaluate trained detectors on the validation + attack splits")
+    parser.add_argument("--models", nargs="+", default=["iforest"],
+                        help=f"{', '.join(MODELS)} or paths to other model artifacts")
+    parser.add_argument("--fpr", type=float, nargs="+", default=FPR_TARGETS,
+                        help="false-positive rates for the detection-rate / confusion columns")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--report", default=REPORT_FILE)
+    parser.add_argument("--curves", default=None, help="also save the ROC / PR curves (.npz)")
+    args = parser.parse_args()
+    evaluate(args.models, args.fpr, args.cache_dir, args.report, args.curves)
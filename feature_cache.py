@@ -0,0 +1,108 @@
+# feature_cache.py
+# Persistent feature matrices shared by training, evaluation, the sweep and analysis.
+#
+# A feature frame is stored once as a float64 .npy (one file per split selection)
+# and memory-mapped on later runs. The cache key combines:
+#   - the dataset content hash (trace store checksum or CSV sha256)
+#   - a hash of the extractor's source code, so editing it invalidates entries
+#   - the extractor parameters (columns) and the split names
+# Retraining with another contamination or evaluating a new model therefore skips
+# feature extraction entirely.
+#
+#   ADFA_FEATURE_CACHE=feature_cache   cache directory (default); set to "" or 0 to disable
+#   python feature_cache.py --list
+#   python feature_cache.py --clear
+import argparse
+import hashlib
+import inspect
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import feature_extraction
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays
+from instrumentation import stage
+from score_cache import artifact_key
+from trace_store import CSV_FILE, STORE_DIR, data_fingerprint, load_split
+
+CACHE_DIR = os.environ.get("ADFA_FEATURE_CACHE", "feature_cache")
+
+
+def source_hash(*objects):
+    """Hash of the source code of modules / functions (changes whenever the code does)"""
+    h = hashlib.blake2b(digest_size=16)
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _enabled(cache_dir):
+    return bool(cache_dir) and str(cache_dir) != "0"
+
+
+def _prune(name, keep, cache_dir):
+    """Remove the entries of `name` superseded by `keep` (other data / code versions)"""
+    for fp in Path(cache_dir).glob(f"{name}-*.npy"):
+        if fp != keep and "." not in fp.stem:  # leaves other writers' temporary files alone
+            fp.unlink(missing_ok=True)
+
+
+def cached_frame(name, compute, columns, key_parts, cache_dir=CACHE_DIR, force=False):
+    """Frame of `columns` from compute(), cached as a memory-mapped .npy under key_parts.
+
+    Hits and misses return the same float64 values, so results do not depend on
+    whether the cache was warm. force=True recomputes and overwrites the entry.
+    Writing an entry removes the older entries of the same name.
+    """
+    if not _enabled(cache_dir):
+        return pd.DataFrame(compute()[columns].to_numpy(dtype=np.float64), columns=columns)
+    key = artifact_key(name, list(columns), *key_parts)
+    path = Path(cache_dir) / f"{name}-{key}.npy"
+    if force or not path.exists():
+        with stage(f"cache_fill_{name}") as st:
+            values = compute()[columns].to_numpy(dtype=np.float64)
+            st.rows = len(values)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + f".{os.getpid()}.tmp.npy")
+        np.save(tmp, values)
+        os.replace(tmp, path)  # concurrent writers produce the same bytes; last one wins
+        _prune(name, path, cache_dir)
+    return pd.DataFrame(np.load(path, mmap_mode="r"), columns=list(columns), copy=False)
+
+
+def load_features(splits="training", columns=FEATURE_COLUMNS, store=STORE_DIR, csv=CSV_FILE,
+                  cache_dir=CACHE_DIR):
+    """features_from_arrays for one split or a list of splits, through the cache"""
+    names = [splits] if isinstance(splits, str) else list(splits)
+
+    def compute():
+        calls, offsets, _ = load_split(names, store, csv)
+        return features_from_arrays(calls, offsets, columns)
+
+    key_parts = [data_fingerprint(store, csv) if _enabled(cache_dir) else None,
+                 source_hash(feature_extraction), names]
+    return cached_frame("features_" + "+".join(names), compute, list(columns), key_parts, cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the feature cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR or "feature_cache")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    files = sorted(Path(args.cache_dir).glob("*.npy"))
+    if args.clear:
+        for f in files:
+            f.unlink()
+        print(f"Removed {len(files)} cached matrices from {args.cache_dir}/")
+        return
+    for f in files:
+        arr = np.load(f, mmap_mode="r")
+        print(f"{f.name:<70} {arr.shape[0]:>10,} x {arr.shape[1]} {f.stat().st_size / 2 ** 20:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
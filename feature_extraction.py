@@ -1,23 +1,150 @@
 # feature_extraction.py
+import re
+from itertools import chain
+
 import numpy as np
 import pandas as pd
 
+from instrumentation import instrument
+
+# Features the IsolationForest pipeline is trained on (order matters)
+FEATURE_COLUMNS = ["length", "unique_calls", "mean_call_log"]
+ALL_FEATURES = ["length", "unique_calls", "mean_call", "std_call", "mean_call_log"]
+
+
 def text_to_numbers(txt):
     nums = [int(t) for t in str(txt).split() if t.isdigit()]
     return nums if nums else [0]
 
-def make_numeric_features(df):
-    df = df.copy()
-    
-    df["seq"] = df["text"].apply(text_to_numbers)
-    df["mean_call"] = df["seq"].apply(np.mean)
-    df["std_call"]  = df["seq"].apply(np.std)
-    df["len_call"]  = df["seq"].apply(len)
+# --------------------------
+# Tokenization (CSR layout)
+# --------------------------
+# Largest supported syscall ID: uint16 in the trace store, 16 bits per call in
+# the n-gram / Markov keys
+MAX_CALL_ID = 0xFFFF
+_NON_NUMERIC = re.compile(r"[^0-9\s]")
+
+
+def _checked_calls(values, token):
+    """int32 calls from parsed IDs (>= 0); ValueError naming the first ID out of range"""
+    bad = np.flatnonzero(~(values <= MAX_CALL_ID))
+    if len(bad):
+        raise ValueError(f"syscall ID {token(bad[0])} is outside the supported range 0-{MAX_CALL_ID}")
+    return values.astype(np.int32)
+
+
+@instrument("tokenize", rows=lambda out: len(out[1]) - 1)
+def tokenize(texts):
+    """Split every trace once into a flat int array plus offsets.
+
+    Trace i is calls[offsets[i]:offsets[i + 1]]. Non-numeric tokens are dropped;
+    a syscall ID above MAX_CALL_ID raises ValueError.
+    """
+    if isinstance(texts, pd.DataFrame):
+        texts = texts["text"]
+    texts = [str(t) for t in texts]
+
+    # Fast path: purely numeric ASCII traces are parsed in one C-level pass. The
+    # trace boundaries come from the token starts in the joined bytes; tokens of
+    # more than 18 digits (which could wrap around in int64) take the slow path.
+    if texts and all(t.isascii() for t in texts) and not any(map(_NON_NUMERIC.search, texts)):
+        joined = " ".join(texts)
+        data = np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+        digit = np.r_[(data >= ord("0")) & (data <= ord("9")), False]
+        edges = np.flatnonzero(digit[1:] != digit[:-1]) + 1  # token starts and ends, alternating
+        if digit[0]:
+            edges = np.r_[0, edges]
+        starts, ends = edges[0::2], edges[1::2]
+        if not len(starts) or (ends - starts).max() <= 18:
+            text_starts = np.zeros(len(texts) + 1, dtype=np.int64)
+            np.cumsum([len(t) + 1 for t in texts], out=text_starts[1:])
+            offsets = np.searchsorted(starts, text_starts).astype(np.int64)
+            values = np.fromstring(joined, dtype=np.int64, sep=" ") if len(starts) else np.zeros(0, np.int64)
+            return _checked_calls(values, lambda i: joined[starts[i]:ends[i]]), offsets
+
+    seqs = [t.split() for t in texts]
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+
+    flat = np.array(list(chain.from_iterable(seqs)), dtype=str)
+    if flat.size:
+        numeric = np.char.isdecimal(flat)
+        if not numeric.all():
+            seg = np.repeat(np.arange(len(seqs)), lengths)
+            lengths = np.bincount(seg[numeric], minlength=len(seqs)).astype(np.int64)
+            flat = flat[numeric]
+    if flat.size:
+        calls = _checked_calls(flat.astype(np.float64), lambda i: flat[i])
+    else:
+        calls = np.zeros(0, dtype=np.int32)
+
+    offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return calls, offsets
+
+# --------------------------
+# Segment reductions
+# --------------------------
+def segment_ids(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def take_traces(calls, offsets, idx):
+    """CSR subset (calls, offsets) of the traces at positions idx"""
+    lengths = np.diff(offsets)[idx]
+    new_offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    pos = np.repeat(np.asarray(offsets)[idx] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return np.asarray(calls)[pos], new_offsets
+
+
+def segment_unique_counts(calls, offsets):
+    """Number of distinct syscalls per trace"""
+    n = len(offsets) - 1
+    if calls.size == 0:
+        return np.zeros(n, dtype=np.int64)
+    # one sort over (trace, syscall) keys, then count key changes per trace
+    calls = np.asarray(calls).astype(np.int64)
+    span = int(calls.max()) + 1
+    keys = np.sort(segment_ids(offsets) * span + calls)
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return np.bincount(keys[first] // span, minlength=n)
+
+
+@instrument("features", rows=len)
+def features_from_arrays(calls, offsets, columns=FEATURE_COLUMNS):
+    """Feature frame computed from CSR-style traces with NumPy reductions"""
+    n = len(offsets) - 1
+    length = np.diff(offsets)
+    seg = segment_ids(offsets)
+    values = calls.astype(np.float64)
+
+    total = np.bincount(seg, weights=values, minlength=n)
+    total_sq = np.bincount(seg, weights=values * values, minlength=n)
+    denom = np.maximum(length, 1)
+    mean = total / denom
+    std = np.sqrt(np.maximum(total_sq / denom - mean * mean, 0.0))
+
+    feats = {
+        "length": length,
+        "unique_calls": segment_unique_counts(calls, offsets),
+        "mean_call": mean,
+        "std_call": std,
+        "mean_call_log": np.log1p(mean),
+    }
+    return pd.DataFrame({c: feats[c] for c in columns})
+
 
-    return df[["mean_call", "std_call", "len_call"]]
+def make_numeric_features(df, columns=FEATURE_COLUMNS):
+    """Features for a frame with a `text` column (or any iterable of traces)"""
+    calls, offsets = tokenize(df)
+    X = features_from_arrays(calls, offsets, columns)
+    if isinstance(df, (pd.DataFrame, pd.Series)):
+        X.index = df.index
+    return X
 
 
 if __name__ == "__main__":
     df = pd.read_csv("adfa_parsed.csv")
-    features = make_numeric_features(df)
+    features = make_numeric_features(df, ALL_FEATURES)
     print(features.head())
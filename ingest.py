@@ -0,0 +1,332 @@
+# ingest.py
+# Parallel, streaming ADFA-LD ingestion: files are read by a thread pool,
+# tokenized to integer syscall arrays and flushed to disk in fixed-size chunks.
+import hashlib
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from trace_store import MANIFEST_FILE, STORE_DIR, TraceStore, TraceStoreWriter, read_manifest, write_manifest
+
+# (directory, split name, label)
+SPLITS = [
+    ("Training_Data_Master", "training", 0),
+    ("Validation_Data_Master", "validation", 0),
+    ("Attack_Data_Master", "attack", 1),
+]
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DEFAULT_CHUNK_SIZE = 10_000
+
+# --------------------------
+# File discovery / reading
+# --------------------------
+def iter_trace_files(base_dir, splits=SPLITS):
+    """Yield (split, label, path) for every trace file, in a stable order"""
+    base_dir = Path(base_dir)
+    for dirname, split_name, lbl in splits:
+        split_dir = base_dir / dirname
+        if not split_dir.exists():
+            print("Missing folder:", split_dir)
+            continue
+        for root, dirs, files in os.walk(split_dir):
+            dirs.sort()
+            for f in sorted(files):
+                yield split_name, lbl, Path(root) / f
+
+
+def parse_calls(text):
+    """Syscall IDs of one trace as an int array"""
+    text = text.strip()
+    if not text:
+        return np.zeros(0, dtype=np.int64)
+    calls = np.fromstring(text, dtype=np.int64, sep=" ")
+    if calls.size != len(text.split()):
+        # non-numeric tokens: fall back to the tolerant parser
+        calls = np.array([int(t) for t in text.split() if t.isdigit()], dtype=np.int64)
+    return calls
+
+
+def read_trace(split, lbl, path):
+    st = path.stat()
+    raw = path.read_bytes()
+    return {
+        "split": split,
+        "file": path.name,
+        "path": str(path),
+        "label": lbl,
+        "calls": parse_calls(raw.decode(errors="ignore")),
+        "nbytes": len(raw),
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": hashlib.sha1(raw).hexdigest(),
+    }
+
+# --------------------------
+# Writers
+# --------------------------
+class CsvChunkWriter:
+    """Appends chunks of records to a CSV with the adfa_parsed.csv columns"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._header = True
+
+    def write_chunk(self, records):
+        df = pd.DataFrame({
+            "split": [r["split"] for r in records],
+            "file": [r["file"] for r in records],
+            "text": [" ".join(map(str, r["calls"].tolist())) for r in records],
+            "label": [r["label"] for r in records],
+        })
+        df.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        if self._header:
+            # no traces at all: still leave a valid, empty CSV behind
+            self.write_chunk([])
+
+class ManifestCollector:
+    """Records source path / size / mtime / sha1 of every trace written"""
+
+    def __init__(self, base_dir, start=0):
+        self.base_dir = Path(base_dir)
+        self.rows = []
+        self.next_index = start
+
+    def write_chunk(self, records):
+        for r in records:
+            rel = Path(r["path"]).relative_to(self.base_dir).as_posix()
+            self.rows.append((rel, r["nbytes"], r["mtime_ns"], r["sha1"], self.next_index))
+            self.next_index += 1
+
+    def close(self):
+        pass
+
+    def frame(self):
+        return pd.DataFrame(self.rows, columns=["path", "size", "mtime_ns", "sha1", "trace"]).set_index("path")
+
+# --------------------------
+# Progress counters
+# --------------------------
+class IngestStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.syscalls = 0
+        self.chunks = 0
+        self.start = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def update(self, rec):
+        self.files += 1
+        self.bytes += rec["nbytes"]
+        self.syscalls += len(rec["calls"])
+
+    def report(self):
+        el = max(self.elapsed, 1e-9)
+        return (f"{self.files:,} traces | {self.syscalls:,} syscalls | {self.bytes / 1e6:,.1f} MB | "
+                f"{self.files / el:,.0f} traces/s | {self.bytes / 1e6 / el:,.1f} MB/s")
+
+# --------------------------
+# Ingestion
+# --------------------------
+def ingest(base_dir, writers, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+           files=None, verbose=True):
+    """Read all trace files under base_dir and stream them to the writers.
+
+    At most `workers * 4` files are in flight and at most `chunk_size` parsed
+    traces are buffered, so memory stays bounded regardless of corpus size.
+    """
+    if not isinstance(writers, (list, tuple)):
+        writers = [writers]
+    files = iter_trace_files(base_dir) if files is None else files
+    stats = IngestStats()
+    chunk = []
+
+    def flush():
+        if chunk:
+            with stage("write_chunk", rows=len(chunk)):
+                for w in writers:
+                    w.write_chunk(chunk)
+            stats.chunks += 1
+            chunk.clear()
+            if verbose:
+                print(stats.report())
+
+    def collect(future):
+        rec = future.result()
+        stats.update(rec)
+        chunk.append(rec)
+        if len(chunk) >= chunk_size:
+            flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for split, lbl, path in files:
+            pending.append(pool.submit(read_trace, split, lbl, path))
+            if len(pending) >= workers * 4:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    flush()
+
+    for w in writers:
+        w.close()
+    if verbose:
+        print("Done:", stats.report())
+    return stats
+
+# --------------------------
+# Incremental ingestion
+# --------------------------
+class _ChangedOnly:
+    """Writer wrapper that drops records whose content hash matches the manifest"""
+
+    def __init__(self, manifest, base_dir, writers):
+        self.manifest = manifest
+        self.base_dir = base_dir
+        self.writers = writers
+        self.touched = {}  # same content, only the mtime moved
+
+    def write_chunk(self, records):
+        changed = []
+        for r in records:
+            rel = Path(r["path"]).relative_to(self.base_dir).as_posix()
+            if rel in self.manifest.index and self.manifest.at[rel, "sha1"] == r["sha1"]:
+                self.touched[rel] = r["mtime_ns"]
+            else:
+                changed.append(r)
+        if changed:
+            for w in self.writers:
+                w.write_chunk(changed)
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+
+def _sibling(store, suffix):
+    return store.parent / (store.name + suffix)
+
+
+def _swap_in(new_dir, store):
+    """Replace the store directory with the complete one built in new_dir"""
+    old_dir = _sibling(store, "_old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if store.exists():
+        os.replace(store, old_dir)
+    os.replace(new_dir, store)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _recover(store):
+    """Finish or roll back a compaction that was interrupted during _swap_in"""
+    new_dir, old_dir = _sibling(store, "_new"), _sibling(store, "_old")
+    if not store.exists():
+        # the manifest is written last, so a new store that has one is complete
+        if (new_dir / MANIFEST_FILE).exists():
+            os.replace(new_dir, store)
+        elif old_dir.exists():
+            os.replace(old_dir, store)
+    shutil.rmtree(new_dir, ignore_errors=True)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def update_store(base_dir, store=STORE_DIR, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                 full=False, verbose=True):
+    """Bring the trace store in line with the files under base_dir.
+
+    Uses the manifest kept next to the store: files whose size and mtime
+    are unchanged are not read at all, changed ones are re-read and only
+    re-ingested if their content hash differs, and files that disappeared
+    are dropped (which compacts the store). New traces are appended.
+
+    A compacted or fully rebuilt store is built completely (manifest
+    included) next to the old one and swapped in; an append is committed by the store's meta.json
+    and then the manifest, and a store whose trace count does not match its
+    manifest (interrupted between the two) is rebuilt from scratch.
+    """
+    base_dir, store = Path(base_dir), Path(store)
+    _recover(store)
+    manifest = None if full else read_manifest(store)
+    if manifest is not None and len(manifest) != len(TraceStore(store)):
+        print(f"{store}: manifest does not match the store ({len(manifest)} vs {len(TraceStore(store))} "
+              f"traces); rebuilding")
+        manifest = None
+
+    if manifest is None:
+        # the live store stays readable until the rebuilt one is swapped in
+        new_dir = _sibling(store, "_new")
+        shutil.rmtree(new_dir, ignore_errors=True)
+        collector = ManifestCollector(base_dir)
+        stats = ingest(base_dir, [TraceStoreWriter(new_dir), collector], workers, chunk_size, verbose=verbose)
+        write_manifest(collector.frame(), new_dir)
+        _swap_in(new_dir, store)
+        return stats
+
+    # 1) stat-only scan against the manifest
+    candidates, seen = [], set()
+    for split, lbl, path in iter_trace_files(base_dir):
+        rel = path.relative_to(base_dir).as_posix()
+        seen.add(rel)
+        if rel in manifest.index:
+            st = path.stat()
+            old = manifest.loc[rel]
+            if st.st_size == old["size"] and st.st_mtime_ns == old["mtime_ns"]:
+                continue
+        candidates.append((split, lbl, path))
+    deleted = set(manifest.index) - seen
+
+    # 2) read candidates into a pending store, keeping only real content changes
+    pending_dir = store / "_pending"
+    collector = ManifestCollector(base_dir)
+    changed_only = _ChangedOnly(manifest, base_dir, [TraceStoreWriter(pending_dir), collector])
+    stats = ingest(base_dir, changed_only, workers, chunk_size, files=candidates, verbose=verbose)
+    new = collector.frame()
+    modified = set(new.index) & set(manifest.index)
+    touched = changed_only.touched
+    for rel, mtime in touched.items():
+        manifest.at[rel, "mtime_ns"] = mtime
+
+    # 3) drop deleted / modified traces (compaction) and append the pending ones
+    removed = deleted | modified
+    kept = manifest.drop(index=list(removed)).sort_values("trace")
+    pending = TraceStore(pending_dir).iter_records(chunk_size=chunk_size) if len(new) else []
+    new["trace"] += len(kept)
+    if removed:
+        # the whole new store is built beside the old one, then swapped in
+        new_dir = _sibling(store, "_new")
+        shutil.rmtree(new_dir, ignore_errors=True)
+        old = TraceStore(store)
+        writer = TraceStoreWriter(new_dir)
+        for records in old.iter_records(kept["trace"].to_numpy(), chunk_size):
+            writer.write_chunk(records)
+        for records in pending:
+            writer.write_chunk(records)
+        writer.close()
+        del old
+        kept["trace"] = np.arange(len(kept))
+        write_manifest(pd.concat([kept, new]), new_dir)
+        _swap_in(new_dir, store)  # also removes the pending store inside the old one
+    else:
+        if len(new):
+            writer = TraceStoreWriter(store, append=True)
+            for records in pending:
+                writer.write_chunk(records)
+            writer.close()  # commits the append (meta.json)
+        write_manifest(pd.concat([kept, new]), store)
+        shutil.rmtree(pending_dir, ignore_errors=True)
+    if verbose:
+        print(f"Incremental ingest: {len(new) - len(modified)} new, {len(modified)} modified, "
+              f"{len(deleted)} deleted, {len(touched)} touched, {len(kept) - len(touched)} unchanged")
+    return stats
@@ -0,0 +1,205 @@
+# instrumentation.py
+# Opt-in stage timing / row counts / memory deltas, with an optional cProfile dump.
+#
+# Off by default: stage() then returns a shared no-op context and @instrument
+# calls the function directly, so the cost is one global lookup per call.
+# Turn it on with environment variables (or enable() from code):
+#
+#   ADFA_INSTRUMENT=1                     enable
+#   ADFA_INSTRUMENT_LOG=stages.jsonl      one JSON record per stage (default instrumentation.jsonl)
+#   ADFA_INSTRUMENT_PROM=stages.prom      Prometheus text file with per-stage totals, written at exit
+#   ADFA_PROFILE_DIR=profiles/            cProfile dump per top-level stage (<dir>/<stage>.<n>.prof)
+#
+#   ADFA_INSTRUMENT=1 ADFA_PROFILE_DIR=profiles python train_ExIso.py
+#   python -m pstats profiles/train.1.prof
+import atexit
+import cProfile
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from pathlib import Path
+
+_enabled = False
+_config = {"log": None, "prom": None, "profile_dir": None}
+_totals = {}                 # stage -> {"calls", "seconds", "rows", "max_seconds", "rss_delta_bytes"}
+_local = threading.local()   # per-thread stack of open stage names
+_lock = threading.Lock()
+_profile_counts = {}
+
+# --------------------------
+# Configuration
+# --------------------------
+def enable(log="instrumentation.jsonl", prom=None, profile_dir=None):
+    global _enabled
+    _config.update(log=log, prom=prom, profile_dir=profile_dir)
+    if profile_dir:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+    if not _enabled and prom:
+        atexit.register(write_prometheus)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def _rss_bytes():
+    """Current resident set size (Linux /proc; falls back to the peak elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+# --------------------------
+# Stages
+# --------------------------
+class _NoopStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+class _Stage:
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.qualname = "/".join(stack + [self.name])
+        self.profiler = None
+        if _config["profile_dir"] and not stack:
+            self.profiler = cProfile.Profile()
+        stack.append(self.name)
+        self.rss0 = _rss_bytes()
+        self.t0 = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        seconds = time.perf_counter() - self.t0
+        rss = _rss_bytes()
+        _local.stack.pop()
+        record = {
+            "stage": self.qualname,
+            "seconds": seconds,
+            "rows": self.rows,
+            "rows_per_sec": self.rows / seconds if self.rows and seconds > 0 else None,
+            "rss_mb": rss / 2 ** 20,
+            "rss_delta_mb": (rss - self.rss0) / 2 ** 20,
+            "ok": exc_type is None,
+            "ts": time.time(),
+        }
+        _record(record, rss - self.rss0)
+        if self.profiler is not None:
+            _dump_profile(self.profiler, self.qualname)
+        return False
+
+
+def stage(name, rows=None):
+    """Context manager timing a block; set `.rows` on the result to report a row count"""
+    if not _enabled:
+        return _NOOP
+    return _Stage(name, rows)
+
+
+def instrument(name=None, rows=None):
+    """Decorator form of stage(); rows(result) gives the row count from the return value"""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(label) as st:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    st.rows = rows(result)
+                return result
+        return inner
+    return wrap
+
+# --------------------------
+# Output
+# --------------------------
+def _record(record, rss_delta):
+    with _lock:
+        t = _totals.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "rows": 0,
+                                                 "max_seconds": 0.0, "rss_delta_bytes": 0})
+        t["calls"] += 1
+        t["seconds"] += record["seconds"]
+        t["rows"] += record["rows"] or 0
+        t["max_seconds"] = max(t["max_seconds"], record["seconds"])
+        t["rss_delta_bytes"] = rss_delta
+        if _config["log"]:
+            with open(_config["log"], "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def _dump_profile(profiler, qualname):
+    with _lock:
+        n = _profile_counts[qualname] = _profile_counts.get(qualname, 0) + 1
+    path = Path(_config["profile_dir"]) / f"{qualname.replace('/', '.')}.{n}.prof"
+    profiler.dump_stats(path)
+
+
+def totals():
+    with _lock:
+        return {k: dict(v) for k, v in _totals.items()}
+
+
+def prometheus_text(prefix="adfa_stage"):
+    lines = []
+    metrics = [("seconds_total", "counter", "seconds"), ("calls_total", "counter", "calls"),
+               ("rows_total", "counter", "rows"), ("seconds_max", "gauge", "max_seconds"),
+               ("rss_delta_bytes", "gauge", "rss_delta_bytes")]
+    snapshot = totals()
+    for suffix, kind, key in metrics:
+        lines.append(f"# TYPE {prefix}_{suffix} {kind}")
+        for name, t in sorted(snapshot.items()):
+            lines.append(f'{prefix}_{suffix}{{stage="{name}"}} {t[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    path = path or _config["prom"]
+    if path:
+        Path(path).write_text(prometheus_text())
+
+
+def report():
+    """Human-readable per-stage summary"""
+    rows = [f"{'stage':<36}{'calls':>7}{'seconds':>11}{'rows':>12}{'rss Δ MB':>10}"]
+    for name, t in sorted(totals().items()):
+        rows.append(f"{name:<36}{t['calls']:>7}{t['seconds']:>11.3f}{t['rows']:>12,}"
+                    f"{t['rss_delta_bytes'] / 2 ** 20:>10.1f}")
+    return "\n".join(rows)
+
+
+if os.environ.get("ADFA_INSTRUMENT", "").lower() not in ("", "0", "false", "no"):
+    enable(log=os.environ.get("ADFA_INSTRUMENT_LOG", "instrumentation.jsonl"),
+           prom=os.environ.get("ADFA_INSTRUMENT_PROM"),
+           profile_dir=os.environ.get("ADFA_PROFILE_DIR"))
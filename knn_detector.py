@@ -0,0 +1,272 @@
+# knn_detector.py
+# Nearest-neighbour detector over MinHash signatures with an LSH index.
+#
+# Each trace is reduced to its set of syscall n-grams (packed as in
+# markov_detector.transition_keys) and summarised by a MinHash signature of
+# `num_perm` 32-bit values; the fraction of equal values between two signatures
+# estimates the Jaccard similarity of the n-gram sets. The signatures of the
+# (deduplicated) training traces are split into `bands` bands, and each band is
+# indexed as a sorted array of band hashes. A query only compares against the
+# training traces that share at least one band bucket, never the whole set.
+#
+# Anomaly score: mean similarity to the k most similar normal traces (higher =
+# more normal); the threshold is the `contamination` percentile of the training
+# scores, computed leave-one-out. Traces with no n-gram (fewer than `ngram`
+# calls) score -1, below any similarity, and are left out of the threshold, so
+# they are anomalous (as in markov_detector.py). The index is a directory of .npy
+# files that is memory-mapped on load.
+#
+#   python knn_detector.py --ngram 3 --num-perm 64 --bands 16     # -> knn_index/
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from feature_extraction import tokenize
+from markov_detector import transition_keys
+from ngram_features import _mix64, chunk_bounds
+
+KNN_DIR = "knn_index"
+FORMAT = 1
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+
+class KNNDetector:
+    """MinHash + LSH approximate k-nearest-neighbour anomaly detector"""
+
+    def __init__(self, ngram=3, num_perm=64, bands=16, k=3, max_bucket=64, contamination=0.01,
+                 seed=42, memory_budget_mb=256):
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.bands = bands
+        self.k = k
+        self.max_bucket = max_bucket
+        self.contamination = contamination
+        self.seed = seed
+        self.memory_budget_mb = memory_budget_mb
+
+    @staticmethod
+    def _arrays(X):
+        if isinstance(X, tuple):
+            return X
+        return tokenize(X)
+
+    def _check(self):
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if not 1 <= self.ngram <= 4:
+            raise ValueError("ngram must be between 1 and 4")
+
+    # --------------------------
+    # Signatures
+    # --------------------------
+    @property
+    def _hash_params(self):
+        # multiply-shift hashing of the mixed n-gram code: h_j(x) = (a_j * x + b_j) >> 32, a_j odd
+        if getattr(self, "_ab", (None,))[0] != (self.seed, self.num_perm):
+            rng = np.random.default_rng(self.seed)
+            a = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+            b = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+            self._ab = ((self.seed, self.num_perm), a, b)
+        return self._ab[1:]
+
+    def signatures(self, X):
+        """(n_traces, num_perm) uint32 MinHash signatures of the traces' n-gram sets"""
+        calls, offsets = self._arrays(X)
+        n = len(offsets) - 1
+        sig = np.full((n, self.num_perm), _EMPTY, dtype=np.uint32)
+        a, b = self._hash_params
+        # one uint64 per n-gram and hash function in flight (plus a temporary)
+        max_values = max(int(self.memory_budget_mb * 2 ** 20 // 16), 1)
+        bounds = chunk_bounds(offsets, 1, self.memory_budget_mb)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            part = np.asarray(calls[offsets[lo]:offsets[hi]])
+            offs = np.asarray(offsets[lo:hi + 1]) - offsets[lo]
+            rows, keys = transition_keys(part, offs, self.ngram - 1)
+            if not len(keys):
+                continue
+            # MinHash only needs each trace's distinct n-grams; traces repeat a lot
+            order = np.lexsort((keys, rows))
+            rows, keys = rows[order], keys[order]
+            distinct = np.r_[True, (rows[1:] != rows[:-1]) | (keys[1:] != keys[:-1])]
+            rows, keys = rows[distinct], _mix64(keys[distinct])
+            # rows are sorted: one reduceat segment per trace that has n-grams
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            present = lo + rows[starts]
+            with np.errstate(over="ignore"):
+                if len(keys) * self.num_perm <= max_values:
+                    # small batches (single traces): all hash functions in one broadcast
+                    h = (keys[:, None] * a + b) >> np.uint64(32)
+                    sig[present] = np.minimum.reduceat(h, starts, axis=0)
+                    continue
+                h = np.empty_like(keys)
+                for j in range(self.num_perm):
+                    np.multiply(keys, a[j], out=h)
+                    h += b[j]
+                    h >>= np.uint64(32)
+                    sig[present, j] = np.minimum.reduceat(h, starts)
+        return sig
+
+    def _band_hashes(self, sig):
+        """(n, bands) uint64 hash of each band of each signature (the band number is mixed in)"""
+        r = self.num_perm // self.bands
+        s = sig.astype(np.uint64).reshape(len(sig), self.bands, r)
+        h = np.broadcast_to(np.arange(self.bands, dtype=np.uint64)[None, :], s.shape[:2]).copy()
+        for i in range(r):
+            h = _mix64(h ^ (s[:, :, i] + np.uint64(0x9E3779B97F4A7C15)))
+        return h
+
+    # --------------------------
+    # Index
+    # --------------------------
+    def fit(self, X, y=None):
+        self._check()
+        sig = self.signatures(X)
+        # identical signatures are stored once, with their multiplicity
+        sig, counts = np.unique(sig, axis=0, return_counts=True)
+        self.signatures_ = sig
+        self.counts_ = counts.astype(np.int64)
+        # one sorted array of all (signature, band) buckets: a query is one searchsorted
+        bh = self._band_hashes(sig).ravel()
+        order = np.argsort(bh, kind="stable")
+        self.bucket_keys_ = bh[order]
+        self.bucket_ids_ = (order // self.bands).astype(np.int32)
+
+        # leave-one-out training scores: a trace does not count as its own neighbour
+        # unless it occurs more than once
+        train = self._scores(sig, leave_one_out=True)
+        scorable = ~self._no_ngrams(sig)
+        if not scorable.any():
+            scorable[:] = True
+        self.offset_ = float(np.percentile(np.repeat(train[scorable], self.counts_[scorable]),
+                                           100.0 * self.contamination))
+        return self
+
+    @staticmethod
+    def _no_ngrams(sig):
+        # a trace without n-grams keeps the initial signature
+        return (sig == _EMPTY).all(axis=1)
+
+    def _candidates(self, sig):
+        """(query, candidate) pairs that share a band bucket, deduplicated"""
+        bh = self._band_hashes(sig).ravel()
+        lo = np.searchsorted(self.bucket_keys_, bh, side="left")
+        cnt = np.minimum(np.searchsorted(self.bucket_keys_, bh, side="right") - lo, self.max_bucket)
+        total = int(cnt.sum())
+        if not total:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        q = np.repeat(np.arange(len(bh)) // self.bands, cnt)
+        pos = np.repeat(lo - (np.cumsum(cnt) - cnt), cnt) + np.arange(total)
+        n = len(self.signatures_)
+        pair = np.unique(q * n + self.bucket_ids_[pos])
+        return pair // n, pair % n
+
+    def _neighbours(self, sig, self_offset=None):
+        """(query, candidate, similarity) for the top-k candidates of each query.
+
+        With self_offset, query i is index row self_offset + i and is not its own
+        neighbour (unless that signature occurs more than once in training).
+        """
+        q, c = self._candidates(sig)
+        if self_offset is not None:
+            keep = (q + self_offset != c) | (self.counts_[c] > 1)
+            q, c = q[keep], c[keep]
+        sim = (sig[q] == self.signatures_[c]).mean(axis=1)
+        order = np.lexsort((-sim, q))
+        q, c, sim = q[order], c[order], sim[order]
+        top = np.arange(len(q)) - np.searchsorted(q, q, side="left") < self.k
+        return q[top], c[top], sim[top]
+
+    def _scores(self, sig, leave_one_out=False, batch=2048):
+        out = np.zeros(len(sig))
+        for lo in range(0, len(sig), batch):
+            part = sig[lo:lo + batch]
+            q, _, sim = self._neighbours(part, lo if leave_one_out else None)
+            # missing neighbours count as similarity 0
+            out[lo:lo + batch] = np.bincount(q, weights=sim, minlength=len(part)) / self.k
+        out[self._no_ngrams(sig)] = -1.0
+        return out
+
+    # --------------------------
+    # Scoring
+    # --------------------------
+    def score_samples(self, X):
+        """Mean estimated Jaccard similarity to the k nearest normal traces"""
+        return self._scores(self.signatures(X))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def detect(self, text):
+        """Dashboard result for one trace text"""
+        sig = self.signatures(tokenize([text]))
+        _, c, sim = self._neighbours(sig)
+        score = float(self._scores(sig)[0] - self.offset_)
+        pred = -1 if score < 0 else 1
+        nearest = float(sim[0]) if len(sim) else 0.0
+        status = "✔️ Normal" if pred == 1 else "⚠️ Suspicious (no close normal trace)"
+        if self._no_ngrams(sig)[0]:
+            status += f"\nToo short to compare: fewer than {self.ngram} syscalls"
+        else:
+            status += f"\nNearest normal trace: estimated Jaccard similarity {nearest:.2f}"
+        return {"pred": pred, "score": score, "nearest": nearest, "status": status}
+
+    # --------------------------
+    # Persistence
+    # --------------------------
+    _ARRAYS = ("signatures_", "counts_", "bucket_keys_", "bucket_ids_")
+    _PARAMS = ("ngram", "num_perm", "bands", "k", "max_bucket", "contamination", "seed")
+
+    def save(self, path=KNN_DIR):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(path / f"{name.rstrip('_')}.npy", getattr(self, name))
+        meta = {"format": FORMAT, "offset": self.offset_, **{p: getattr(self, p) for p in self._PARAMS}}
+        (path / "meta.json").write_text(json.dumps(meta, indent=2))
+        print(f"kNN index saved → {path}/ ({len(self.signatures_):,} distinct signatures)")
+
+    @classmethod
+    def load(cls, path=KNN_DIR, mmap_mode="r"):
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        if meta["format"] != FORMAT:
+            raise ValueError(f"unsupported kNN index format {meta['format']}")
+        model = cls(**{p: meta[p] for p in cls._PARAMS})
+        model.offset_ = meta["offset"]
+        for name in cls._ARRAYS:
+            # plain ndarray views of the mapping: no np.memmap overhead on every small gather
+            setattr(model, name, np.asarray(np.load(path / f"{name.rstrip('_')}.npy", mmap_mode=mmap_mode)))
+        return model
+
+
+def train_knn(ngram=3, num_perm=64, bands=16, k=3, contamination=0.01, out_path=KNN_DIR):
+    from trace_store import load_split
+
+    calls, offsets, meta = load_split("training")  # normal only
+    t0 = time.perf_counter()
+    model = KNNDetector(ngram, num_perm, bands, k, contamination=contamination).fit((calls, offsets))
+    print(f"kNN index built on {len(meta)} traces in {time.perf_counter() - t0:.2f}s")
+    model.save(out_path)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the MinHash / LSH nearest-neighbour index")
+    parser.add_argument("--ngram", type=int, default=3)
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--k", type=int, default=3, help="neighbours averaged into the score")
+    parser.add_argument("--contamination", type=float, default=0.01)
+    parser.add_argument("--out", default=KNN_DIR)
+    args = parser.parse_args()
+    train_knn(args.ngram, args.num_perm, args.bands, args.k, args.contamination, args.out)
+
+
+if __name__ == "__main__":
+    main()
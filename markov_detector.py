@@ -0,0 +1,212 @@
+# markov_detector.py
+# Syscall transition model: a second detector that sees the order of the calls.
+#
+# A Markov chain of order 1-3 is fitted on the training split. Each transition
+# (previous `order` calls -> next call) is packed into one uint64 key (16 bits
+# per call, as in the trace store), and the model is just the sorted array of
+# observed keys with their smoothed log-probabilities, plus one "unseen next
+# call" log-probability per observed context. Scoring a batch is a vectorized
+# key build, a searchsorted gather and a per-trace bincount sum: the score of a
+# trace is its mean log-likelihood per transition. Traces too short to contain a
+# transition (fewer than order + 1 calls) score below any other trace and are
+# left out of the threshold, so they are anomalous (as in knn_detector.py).
+#
+# Same conventions as the IsolationForest pipeline: decision_function < 0 is an
+# anomaly (the threshold is the `contamination` percentile of the training
+# scores) and predict() returns 1 / -1. Inputs are (calls, offsets) tuples or
+# raw trace texts.
+#
+#   python markov_detector.py --order 2            # fit on the training split -> markov_model.npz
+import argparse
+import time
+
+import numpy as np
+
+from feature_extraction import tokenize
+from ngram_features import CALL_BITS, chunk_bounds
+
+MARKOV_FILE = "markov_model.npz"
+FORMAT = 1
+
+
+def transition_keys(calls, offsets, order):
+    """(row, key) of every transition inside a trace: `order` context calls + the next call"""
+    calls = np.asarray(calls).astype(np.uint64)
+    n_rows = len(offsets) - 1
+    m = len(calls) - order
+    if m <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+    seg = np.repeat(np.arange(n_rows), np.diff(offsets))
+    key = calls[:m].copy()
+    for j in range(1, order + 1):
+        key = (key << np.uint64(CALL_BITS)) | calls[j:m + j]
+    inside = seg[:m] == seg[order:]
+    return seg[:m][inside], key[inside]
+
+
+class MarkovDetector:
+    """Sparse transition-probability model of syscall sequences"""
+
+    def __init__(self, order=1, alpha=0.1, contamination=0.01, memory_budget_mb=256):
+        self.order = order
+        self.alpha = alpha
+        self.contamination = contamination
+        self.memory_budget_mb = memory_budget_mb
+
+    @staticmethod
+    def _arrays(X):
+        if isinstance(X, tuple):
+            return X
+        return tokenize(X)
+
+    def _chunks(self, calls, offsets):
+        # transition keys take about as much memory per call as (order + 1)-grams
+        bounds = chunk_bounds(offsets, self.order + 1, self.memory_budget_mb)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            part = np.asarray(calls[offsets[lo]:offsets[hi]])
+            yield lo, hi, part, np.asarray(offsets[lo:hi + 1]) - offsets[lo]
+
+    def fit(self, X, y=None):
+        if not 1 <= self.order <= 64 // CALL_BITS - 1:
+            raise ValueError(f"order must be between 1 and {64 // CALL_BITS - 1}")
+        calls, offsets = self._arrays(X)
+        keys, freq = [], []
+        for _, _, part, offs in self._chunks(calls, offsets):
+            k, c = np.unique(transition_keys(part, offs, self.order)[1], return_counts=True)
+            keys.append(k)
+            freq.append(c)
+        keys = np.concatenate(keys) if keys else np.zeros(0, np.uint64)
+        freq = np.concatenate(freq) if freq else np.zeros(0, np.int64)
+        keys, inv = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inv.ravel(), weights=freq, minlength=len(keys))
+
+        # additive smoothing over the syscalls seen in training (+1 for "anything else")
+        n_symbols = len(np.unique(np.asarray(calls))) + 1
+        contexts, ctx_inv = np.unique(keys >> np.uint64(CALL_BITS), return_inverse=True)
+        ctx_total = np.bincount(ctx_inv.ravel(), weights=counts, minlength=len(contexts))
+        denom = ctx_total + self.alpha * n_symbols
+        self.keys_ = keys
+        self.log_prob_ = np.log((counts + self.alpha) / denom[ctx_inv.ravel()])
+        self.contexts_ = contexts
+        self.unseen_log_prob_ = np.log(self.alpha / denom)
+        self.unknown_context_log_prob_ = float(-np.log(n_symbols))
+        self.n_symbols_ = n_symbols
+
+        train = self.score_samples((calls, offsets))
+        scorable = np.diff(np.asarray(offsets)) > self.order
+        self.offset_ = float(np.percentile(train[scorable] if scorable.any() else train, 100.0 * self.contamination))
+        return self
+
+    def _log_probs(self, keys):
+        pos = np.minimum(np.searchsorted(self.keys_, keys), len(self.keys_) - 1)
+        seen = self.keys_[pos] == keys
+        lp = self.log_prob_[pos]
+        if not seen.all():
+            ctx = keys[~seen] >> np.uint64(CALL_BITS)
+            cpos = np.minimum(np.searchsorted(self.contexts_, ctx), len(self.contexts_) - 1)
+            lp[~seen] = np.where(self.contexts_[cpos] == ctx, self.unseen_log_prob_[cpos],
+                                 self.unknown_context_log_prob_)
+        return lp
+
+    @property
+    def short_trace_score_(self):
+        """Score of a trace without transitions: below the lowest log-probability any transition can get"""
+        return float(min(self.log_prob_.min(initial=0.0), self.unseen_log_prob_.min(initial=0.0),
+                         self.unknown_context_log_prob_)) - 1.0
+
+    def score_samples(self, X):
+        """Mean log-likelihood per transition (higher = more normal)"""
+        calls, offsets = self._arrays(X)
+        n = len(offsets) - 1
+        total = np.zeros(n)
+        count = np.zeros(n)
+        for lo, hi, part, offs in self._chunks(calls, offsets):
+            rows, keys = transition_keys(part, offs, self.order)
+            total[lo:hi] = np.bincount(rows, weights=self._log_probs(keys), minlength=hi - lo)
+            count[lo:hi] = np.bincount(rows, minlength=hi - lo)
+        return np.where(count > 0, total / np.maximum(count, 1), self.short_trace_score_)
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def rarest_transition(self, calls):
+        """(context calls, next call, log-probability) of the least likely step of one trace"""
+        calls = np.asarray(calls)
+        _, keys = transition_keys(calls, np.array([0, len(calls)]), self.order)
+        if not len(keys):
+            return None
+        i = int(np.argmin(self._log_probs(keys)))
+        window = calls[i:i + self.order + 1].tolist()
+        return window[:-1], window[-1], float(self._log_probs(keys[i:i + 1])[0])
+
+    def detect(self, text):
+        """Dashboard result for one trace text"""
+        calls, offsets = tokenize([text])
+        score = float(self.decision_function((calls, offsets))[0])
+        pred = -1 if score < 0 else 1
+        status = "✔️ Normal"
+        if pred == -1:
+            status = "⚠️ Suspicious (Markov: unlikely syscall transitions)"
+            worst = self.rarest_transition(calls)
+            if worst is None:
+                status += f"\nSuggestions:\nToo short to score: fewer than {self.order + 1} syscalls"
+            else:
+                ctx, nxt, lp = worst
+                status += (f"\nSuggestions:\nRarest transition: {' → '.join(map(str, ctx))} → {nxt} "
+                           f"(log p = {lp:.2f})")
+        return {"pred": pred, "score": score, "status": status}
+
+    # --------------------------
+    # Persistence
+    # --------------------------
+    def save(self, path=MARKOV_FILE):
+        np.savez(path, format=np.int64(FORMAT), order=np.int64(self.order), alpha=np.float64(self.alpha),
+                 contamination=np.float64(self.contamination), keys=self.keys_, log_prob=self.log_prob_,
+                 contexts=self.contexts_, unseen_log_prob=self.unseen_log_prob_,
+                 unknown_context_log_prob=np.float64(self.unknown_context_log_prob_),
+                 n_symbols=np.int64(self.n_symbols_), offset=np.float64(self.offset_))
+        print(f"Markov model saved → {path}")
+
+    @classmethod
+    def load(cls, path=MARKOV_FILE):
+        with np.load(path) as z:
+            if int(z["format"]) != FORMAT:
+                raise ValueError(f"unsupported Markov model format {int(z['format'])}")
+            model = cls(order=int(z["order"]), alpha=float(z["alpha"]), contamination=float(z["contamination"]))
+            model.keys_ = z["keys"]
+            model.log_prob_ = z["log_prob"]
+            model.contexts_ = z["contexts"]
+            model.unseen_log_prob_ = z["unseen_log_prob"]
+            model.unknown_context_log_prob_ = float(z["unknown_context_log_prob"])
+            model.n_symbols_ = int(z["n_symbols"])
+            model.offset_ = float(z["offset"])
+        return model
+
+
+def train_markov(order=1, alpha=0.1, contamination=0.01, out_path=MARKOV_FILE):
+    from trace_store import load_split
+
+    calls, offsets, meta = load_split("training")  # normal only
+    t0 = time.perf_counter()
+    model = MarkovDetector(order, alpha, contamination).fit((calls, offsets))
+    print(f"Order-{order} Markov model fitted on {len(meta)} traces in {time.perf_counter() - t0:.2f}s "
+          f"({len(model.keys_):,} transitions, {len(model.contexts_):,} contexts)")
+    model.save(out_path)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the syscall transition (Markov) detector")
+    parser.add_argument("--order", type=int, default=1, choices=[1, 2, 3])
+    parser.add_argument("--alpha", type=float, default=0.1, help="additive smoothing")
+    parser.add_argument("--contamination", type=float, default=0.01)
+    parser.add_argument("--out", default=MARKOV_FILE)
+    args = parser.parse_args()
+    train_markov(args.order, args.alpha, args.contamination, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# ngram_features.py
+# Syscall n-gram (n = 1..k) features as a SciPy CSR matrix.
+#
+# N-grams are encoded as integers with a vectorized rolling window over the flat
+# syscall array from feature_extraction.tokenize (code_n = code_{n-1} * 2^bits + next),
+# then either hashed into a fixed number of columns or mapped through a vocabulary
+# fitted on the training split. Traces are processed in chunks sized from a memory
+# budget, so the full corpus never has to be expanded at once.
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import normalize
+
+from feature_extraction import tokenize
+
+CALL_BITS = 16  # matches the uint16 trace store; n_max * CALL_BITS must fit in 64 bits
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix64(x):
+    """splitmix64 finalizer: cheap, well-spread 64-bit hash of uint64 codes"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def iter_ngram_codes(calls, offsets, n_max):
+    """Yield (n, row, code) arrays for every n-gram that fits inside its trace"""
+    calls = np.asarray(calls).astype(np.uint64)
+    n_rows = len(offsets) - 1
+    seg = np.repeat(np.arange(n_rows), np.diff(offsets))
+    ends = np.asarray(offsets[1:])
+    code = calls.copy()
+    with np.errstate(over="ignore"):
+        for n in range(1, n_max + 1):
+            if n > 1:
+                code = (code[:-1] << np.uint64(CALL_BITS)) | calls[n - 1:]
+            starts = np.arange(len(code))
+            valid = starts + n <= ends[seg[:len(code)]]
+            yield n, seg[:len(code)][valid], code[valid]
+
+
+def chunk_bounds(offsets, n_max, memory_budget_mb):
+    """Split traces into chunks whose expanded n-gram arrays fit the budget"""
+    # per syscall and n: uint64 code + int64 row + uint64 key + sort scratch
+    bytes_per_call = 32 * n_max
+    max_calls = max(int(memory_budget_mb * 2 ** 20 // bytes_per_call), 1)
+    bounds = [0]
+    n_rows = len(offsets) - 1
+    while bounds[-1] < n_rows:
+        start = bounds[-1]
+        stop = int(np.searchsorted(offsets, offsets[start] + max_calls, side="right")) - 1
+        bounds.append(min(max(stop, start + 1), n_rows))
+    return bounds
+
+
+class NgramFeaturizer(BaseEstimator, TransformerMixin):
+    """n-gram counts of syscall traces as a CSR matrix.
+
+    Accepts raw trace texts (like make_numeric_features) or a (calls, offsets)
+    tuple from the trace store. mode="hash" needs no fitting; mode="vocab" keeps
+    the `max_features` most frequent training n-grams.
+    """
+
+    def __init__(self, n_max=3, n_features=2 ** 14, mode="hash", max_features=None,
+                 sublinear_tf=True, norm="l2", memory_budget_mb=256):
+        self.n_max = n_max
+        self.n_features = n_features
+        self.mode = mode
+        self.max_features = max_features
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.memory_budget_mb = memory_budget_mb
+
+    @staticmethod
+    def _arrays(X):
+        if isinstance(X, tuple):
+            return X
+        return tokenize(X)
+
+    def _check(self):
+        if self.n_max * CALL_BITS > 64:
+            raise ValueError(f"n_max={self.n_max} does not fit {CALL_BITS}-bit syscalls in 64-bit codes")
+
+    def _keys(self, n, code):
+        # tag the code with its order so a 1-gram and a 2-gram never collide by construction
+        return _mix64(code ^ (np.asarray(n, dtype=np.uint64) * _GOLDEN))
+
+    def fit(self, X, y=None):
+        self._check()
+        if self.mode == "vocab":
+            calls, offsets = self._arrays(X)
+            keys, freq = [], []
+            bounds = chunk_bounds(offsets, self.n_max, self.memory_budget_mb)
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                part = calls[offsets[lo]:offsets[hi]]
+                for n, _, code in iter_ngram_codes(part, offsets[lo:hi + 1] - offsets[lo], self.n_max):
+                    k, c = np.unique(self._keys(n, code), return_counts=True)
+                    keys.append(k)
+                    freq.append(c)
+            keys = np.concatenate(keys) if keys else np.zeros(0, np.uint64)
+            freq = np.concatenate(freq) if freq else np.zeros(0, np.int64)
+            uniq, inv = np.unique(keys, return_inverse=True)
+            total = np.bincount(inv, weights=freq).astype(np.int64)
+            if self.max_features and len(uniq) > self.max_features:
+                keep = np.argsort(-total, kind="stable")[:self.max_features]
+                uniq = np.sort(uniq[keep])
+            self.vocabulary_ = uniq
+        return self
+
+    def _columns(self, keys):
+        if self.mode == "vocab":
+            pos = np.searchsorted(self.vocabulary_, keys)
+            pos = np.minimum(pos, len(self.vocabulary_) - 1)
+            known = self.vocabulary_[pos] == keys
+            return pos, known
+        return (keys % np.uint64(self.n_features)).astype(np.int64), None
+
+    @property
+    def n_columns(self):
+        return len(self.vocabulary_) if self.mode == "vocab" else self.n_features
+
+    def transform(self, X):
+        self._check()
+        calls, offsets = self._arrays(X)
+        n_cols = self.n_columns
+        bounds = chunk_bounds(offsets, self.n_max, self.memory_budget_mb)
+        blocks = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            part = calls[offsets[lo]:offsets[hi]]
+            rows_all, cols_all = [], []
+            for n, rows, code in iter_ngram_codes(part, offsets[lo:hi + 1] - offsets[lo], self.n_max):
+                cols, known = self._columns(self._keys(n, code))
+                if known is not None:
+                    rows, cols = rows[known], cols[known]
+                rows_all.append(rows)
+                cols_all.append(cols)
+            rows = np.concatenate(rows_all) if rows_all else np.zeros(0, np.int64)
+            cols = np.concatenate(cols_all) if cols_all else np.zeros(0, np.int64)
+            # one sort of (row, col) keys, then run-length counts -> CSR directly
+            flat, counts = np.unique(rows * n_cols + cols, return_counts=True)
+            r, c = np.divmod(flat, n_cols)
+            indptr = np.zeros(hi - lo + 1, dtype=np.int64)
+            np.cumsum(np.bincount(r, minlength=hi - lo), out=indptr[1:])
+            blocks.append(sparse.csr_matrix((counts.astype(np.float64), c, indptr), shape=(hi - lo, n_cols)))
+        M = sparse.vstack(blocks, format="csr") if blocks else sparse.csr_matrix((0, n_cols))
+        return self._weight(M)
+
+    def transform_counts(self, counts):
+        """CSR rows from precomputed {(n, code): count} dicts (streaming state)"""
+        self._check()
+        sizes = [len(c) for c in counts]
+        rows = np.repeat(np.arange(len(counts)), sizes)
+        ns = np.fromiter((k[0] for c in counts for k in c), dtype=np.uint64, count=sum(sizes))
+        codes = np.fromiter((k[1] for c in counts for k in c), dtype=np.uint64, count=sum(sizes))
+        vals = np.fromiter((v for c in counts for v in c.values()), dtype=np.float64, count=sum(sizes))
+        cols, known = self._columns(self._keys(ns, codes))
+        if known is not None:
+            rows, cols, vals = rows[known], cols[known], vals[known]
+        M = sparse.csr_matrix((vals, (rows, cols)), shape=(len(counts), self.n_columns))
+        M.sum_duplicates()
+        return self._weight(M)
+
+    def _weight(self, M):
+        if self.sublinear_tf:
+            M.data = np.log1p(M.data)
+        if self.norm:
+            M = normalize(M, norm=self.norm, copy=False)
+        return M
+
+
+def ngram_matrix(texts_or_arrays, n_max=3, n_features=2 ** 14, **kwargs):
+    """Hashed n-gram CSR matrix in one call"""
+    return NgramFeaturizer(n_max=n_max, n_features=n_features, **kwargs).fit_transform(texts_or_arrays)
@@ -0,0 +1,256 @@
+# out_of_core.py
+# Training on corpora larger than RAM.
+#
+# The training split is streamed in chunks sized from the memory budget (trace
+# store: by syscall count; CSV: by the size of the rows read so far). Each chunk
+# is turned into features and folded into three bounded summaries:
+#
+#   - a quantile sketch per feature   -> RobustScaler center / scale and the
+#                                        baseline-stats quantiles
+#   - running count / mean / M2 / min / max per feature -> baseline stats
+#   - a uniform reservoir sample of feature rows        -> IsolationForest fit
+#
+# IsolationForest only looks at max_samples rows per tree ("auto" = 256), so a
+# large uniform sample gives the same kind of forest as the full split; the
+# contamination threshold is the percentile of the sample's scores. The result
+# is an ordinary fitted Pipeline, usable everywhere the in-memory one is.
+#
+#   python train_ExIso.py --out-of-core --memory-budget-mb 512
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import RobustScaler
+
+from baseline_stats import QUANTILES
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays, tokenize
+from instrumentation import stage
+from trace_store import CSV_FILE, STORE_DIR, TraceStore, has_store
+
+BYTES_PER_CALL = 64          # features_from_arrays working set per syscall (ids, weights, sort keys)
+CSV_EXPANSION = 4            # tokenizing a CSV chunk needs ~4x the chunk's own size
+STORE_WINDOW = 1 << 20       # split codes are scanned this many traces at a time
+
+# --------------------------
+# Bounded summaries
+# --------------------------
+class QuantileSketch:
+    """Mergeable quantile summary of a stream of values in O(k) memory.
+
+    Values are kept as (value, weight) pairs. Exact duplicates are always merged,
+    so a feature with at most k distinct values (trace lengths, unique-call
+    counts) keeps its exact distribution. Past k distinct values, neighbours are
+    merged into k bins of equal weight (rank error about 1/k).
+    """
+
+    def __init__(self, k=4096):
+        self.k = k
+        self.values = np.zeros(0)
+        self.weights = np.zeros(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        v = np.concatenate([self.values, values])
+        w = np.concatenate([self.weights, np.ones(len(values))])
+        self.values, self.weights = self._compress(v, w)
+        return self
+
+    def _compress(self, v, w):
+        v, inv = np.unique(v, return_inverse=True)
+        w = np.bincount(inv.ravel(), weights=w, minlength=len(v))
+        if len(v) <= self.k:
+            return v, w
+        cw = np.cumsum(w)
+        bins = np.minimum(((cw - w) / cw[-1] * self.k).astype(np.int64), self.k - 1)
+        counts = np.bincount(bins, weights=w, minlength=self.k)
+        sums = np.bincount(bins, weights=v * w, minlength=self.k)
+        keep = counts > 0
+        return sums[keep] / counts[keep], counts[keep]
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def quantile(self, q):
+        """Linear-interpolated quantiles, as np.quantile on the expanded values"""
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.values):
+            return np.full(q.shape, np.nan)
+        cw = np.cumsum(self.weights)
+        pos = q * (cw[-1] - 1)
+        lo = np.floor(pos)
+        hi = np.minimum(lo + 1, cw[-1] - 1)
+        v_lo = self.values[np.searchsorted(cw, lo, side="right")]
+        v_hi = self.values[np.searchsorted(cw, hi, side="right")]
+        return v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+class FeatureSummary:
+    """Streaming per-feature moments, extremes and quantile sketches"""
+
+    def __init__(self, columns=FEATURE_COLUMNS, k=4096):
+        self.columns = list(columns)
+        d = len(self.columns)
+        self.count = np.zeros(d)
+        self.mean = np.zeros(d)
+        self.m2 = np.zeros(d)
+        self.min = np.full(d, np.inf)
+        self.max = np.full(d, -np.inf)
+        self.sketches = [QuantileSketch(k) for _ in self.columns]
+        self.n_rows = 0
+
+    def update(self, X):
+        self.n_rows += len(X)
+        for j, col in enumerate(self.columns):
+            values = np.asarray(X[col], dtype=np.float64)
+            values = values[np.isfinite(values)]
+            if not len(values):
+                continue
+            # Chan et al. merge of (count, mean, M2)
+            n, mean = len(values), values.mean()
+            m2 = ((values - mean) ** 2).sum()
+            total = self.count[j] + n
+            delta = mean - self.mean[j]
+            self.mean[j] += delta * n / total
+            self.m2[j] += m2 + delta * delta * self.count[j] * n / total
+            self.count[j] = total
+            self.min[j] = min(self.min[j], values.min())
+            self.max[j] = max(self.max[j], values.max())
+            self.sketches[j].update(values)
+        return self
+
+    def baseline_stats(self, split="training"):
+        """Same layout as baseline_stats.compute_baseline_stats"""
+        features = {}
+        for j, col in enumerate(self.columns):
+            features[col] = {
+                "mean": float(self.mean[j]),
+                "std": float(np.sqrt(self.m2[j] / max(self.count[j], 1))),
+                "min": float(self.min[j]),
+                "max": float(self.max[j]),
+                "quantiles": {str(q): float(v) for q, v in zip(QUANTILES, self.sketches[j].quantile(QUANTILES))},
+            }
+        return {"split": split, "n_samples": int(self.n_rows), "features": features}
+
+    def robust_scaler(self, quantile_range=(25.0, 75.0)):
+        """A fitted RobustScaler whose center / scale come from the sketches"""
+        q = np.array([50.0, *quantile_range]) / 100.0
+        qs = np.array([s.quantile(q) for s in self.sketches])
+        scale = qs[:, 2] - qs[:, 1]
+        scaler = RobustScaler(quantile_range=quantile_range)
+        scaler.center_ = qs[:, 0]
+        scaler.scale_ = np.where(scale == 0, 1.0, scale)  # as sklearn handles constant features
+        scaler.n_features_in_ = len(self.columns)
+        scaler.feature_names_in_ = np.asarray(self.columns, dtype=object)
+        return scaler
+
+
+class Reservoir:
+    """Uniform sample of up to `capacity` rows from a stream (algorithm R, vectorized per chunk)"""
+
+    def __init__(self, capacity, n_features, seed=42):
+        self.capacity = capacity
+        self.rows = np.empty((capacity, n_features))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        fill = min(max(self.capacity - self.seen, 0), len(X))
+        self.rows[self.seen:self.seen + fill] = X[:fill]
+        rest = X[fill:]
+        if len(rest):
+            # row t (0-based stream position) replaces slot j ~ U[0, t] when j < capacity;
+            # later rows win on repeated slots, as in the sequential algorithm
+            t = self.seen + fill + np.arange(len(rest))
+            j = self.rng.integers(0, t + 1)
+            take = j < self.capacity
+            self.rows[j[take]] = rest[take]
+        self.seen += len(X)
+        return self
+
+    def sample(self):
+        return self.rows[:min(self.seen, self.capacity)]
+
+# --------------------------
+# Chunked feature stream
+# --------------------------
+def _store_chunks(path, split, max_calls):
+    ts = TraceStore(path)
+    if split not in ts.splits:
+        return
+    code = ts.splits.index(split)
+    for start in range(0, len(ts), STORE_WINDOW):
+        idx = start + np.flatnonzero(np.asarray(ts.split_codes[start:start + STORE_WINDOW]) == code)
+        if not len(idx):
+            continue
+        calls_before = np.concatenate([[0], np.cumsum(ts.offsets[idx + 1] - ts.offsets[idx])])
+        lo = 0
+        while lo < len(idx):
+            hi = int(np.searchsorted(calls_before, calls_before[lo] + max_calls, side="right")) - 1
+            hi = min(max(hi, lo + 1), len(idx))
+            yield ts.select(idx[lo:hi])
+            lo = hi
+
+
+def _csv_chunks(path, split, max_bytes, first_rows=1000):
+    reader = pd.read_csv(path, iterator=True)
+    rows = first_rows
+    while True:
+        try:
+            df = reader.get_chunk(rows)
+        except StopIteration:
+            break
+        # next chunk size from the bytes per row seen so far
+        per_row = df.memory_usage(deep=True).sum() * CSV_EXPANSION / max(len(df), 1)
+        rows = max(int(max_bytes // max(per_row, 1)), 1)
+        df = df[df["split"] == split]
+        if len(df):
+            yield tokenize(df["text"])
+    reader.close()
+
+
+def iter_split_features(split="training", memory_budget_mb=128, store=STORE_DIR, csv=CSV_FILE):
+    """Feature frames of one split, chunk by chunk, each chunk within the memory budget"""
+    max_bytes = memory_budget_mb * 2 ** 20
+    if has_store(store):
+        chunks = _store_chunks(store, split, max(max_bytes // BYTES_PER_CALL, 1))
+    else:
+        chunks = _csv_chunks(csv, split, max_bytes)
+    for calls, offsets in chunks:
+        yield features_from_arrays(np.asarray(calls), offsets)
+
+# --------------------------
+# Fit
+# --------------------------
+def fit_out_of_core(n_estimators=300, max_samples="auto", contamination=0.01, memory_budget_mb=256,
+                    sample_rows=100_000, sketch_size=4096, random_state=42, store=STORE_DIR, csv=CSV_FILE):
+    """(pipeline, baseline stats) fitted in one streaming pass over the training split.
+
+    Half the budget goes to the feature chunks; the reservoir gets at most a
+    quarter (the forest fit makes a scaled float32 copy and scores it once).
+    """
+    budget = memory_budget_mb * 2 ** 20
+    n_features = len(FEATURE_COLUMNS)
+    capacity = max(min(sample_rows, int(budget / 4 // (n_features * 8 * 3))), 1)
+
+    summary = FeatureSummary(FEATURE_COLUMNS, k=sketch_size)
+    reservoir = Reservoir(capacity, n_features, seed=random_state)
+    with stage("stream_features") as st:
+        for X in iter_split_features("training", memory_budget_mb / 2, store, csv):
+            summary.update(X)
+            reservoir.update(X[FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+        st.rows = summary.n_rows
+    if summary.n_rows == 0:
+        raise ValueError("no training traces found")
+
+    scaler = summary.robust_scaler()
+    sample = reservoir.sample()
+    iforest = IsolationForest(n_estimators=n_estimators, max_samples=max_samples,
+                              contamination=contamination, random_state=random_state)
+    with stage("fit_iforest", rows=len(sample)):
+        iforest.fit(scaler.transform(pd.DataFrame(sample, columns=FEATURE_COLUMNS)))
+    pipeline = Pipeline([("scaler", scaler), ("iforest", iforest)])
+    print(f"Streamed {summary.n_rows:,} training traces; forest fitted on a sample of {len(sample):,}")
+    return pipeline, summary.baseline_stats()
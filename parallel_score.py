@@ -0,0 +1,116 @@
+# parallel_score.py
+# Process-pool IsolationForest scoring for many-core hosts.
+#
+# Every worker loads the fitted pipeline once, in its initializer. Each worker
+# holds its own copy of the trees (sklearn copies the node arrays when a tree is
+# unpickled, memory-mapped or not), so memory grows with model size x workers.
+# Feature rows and scores travel through shared memory, so a task is just a
+# (start, stop) range: neither the model nor the data is pickled per task.
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_extraction import FEATURE_COLUMNS
+
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+
+# --------------------------
+# Worker side
+# --------------------------
+_worker = {}
+
+
+def _init_worker(model_path, in_name, out_name, max_rows, n_features):
+    pipeline = joblib.load(model_path)
+    iforest = pipeline.steps[-1][1]
+    if "n_jobs" in iforest.get_params():
+        iforest.set_params(n_jobs=1)  # one core per worker, no oversubscription
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    _worker.update(
+        pipeline=pipeline,
+        # the columns the pipeline was fitted on (plain arrays if it was fitted without names)
+        columns=getattr(pipeline, "feature_names_in_", None),
+        shm=(shm_in, shm_out),
+        X=np.ndarray((max_rows, n_features), dtype=np.float64, buffer=shm_in.buf),
+        out=np.ndarray((max_rows,), dtype=np.float64, buffer=shm_out.buf),
+    )
+
+
+def _score_range(start, stop):
+    X = _worker["X"][start:stop]
+    if _worker["columns"] is not None:
+        X = pd.DataFrame(X, columns=_worker["columns"])
+    _worker["out"][start:stop] = _worker["pipeline"].decision_function(X)
+    return stop - start
+
+# --------------------------
+# Parent side
+# --------------------------
+class ProcessScorer:
+    """decision_function over a process pool.
+
+    Use as a context manager; `decision_function(X)` can be called with any
+    number of rows (batches larger than `max_rows` are processed in pieces).
+    """
+
+    def __init__(self, model_path=MODEL_FILE, n_workers=None, max_rows=100_000,
+                 n_features=len(FEATURE_COLUMNS), shards_per_worker=4):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.max_rows = max_rows
+        self.n_features = n_features
+        self.shards_per_worker = shards_per_worker
+        self._shm_in = shared_memory.SharedMemory(create=True, size=max_rows * n_features * 8)
+        self._shm_out = shared_memory.SharedMemory(create=True, size=max_rows * 8)
+        self._X = np.ndarray((max_rows, n_features), dtype=np.float64, buffer=self._shm_in.buf)
+        self._out = np.ndarray((max_rows,), dtype=np.float64, buffer=self._shm_out.buf)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_init_worker,
+            initargs=(str(model_path), self._shm_in.name, self._shm_out.name, max_rows, n_features),
+        )
+
+    def warm_up(self):
+        """Start all workers (and load the model in each) before timing anything"""
+        wait([self.pool.submit(_score_range, 0, 0) for _ in range(self.n_workers)])
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        scores = np.empty(len(X), dtype=np.float64)
+        for lo in range(0, len(X), self.max_rows):
+            part = X[lo:lo + self.max_rows]
+            n = len(part)
+            self._X[:n] = part
+            n_shards = min(n, self.n_workers * self.shards_per_worker)
+            bounds = np.linspace(0, n, n_shards + 1, dtype=np.int64)
+            futures = [self.pool.submit(_score_range, int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+            for f in futures:
+                f.result()
+            scores[lo:lo + n] = self._out[:n]
+        return scores
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def close(self):
+        self.pool.shutdown()
+        del self._X, self._out
+        for shm in (self._shm_in, self._shm_out):
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_parallel(X, model_path=MODEL_FILE, n_workers=None):
+    """One-shot helper: decision_function scores of X using a process pool"""
+    with ProcessScorer(model_path, n_workers, max_rows=max(len(X), 1), n_features=np.shape(X)[1]) as scorer:
+        return scorer.decision_function(X)
@@ -1,42 +1,38 @@
 # prepare_data.py
-import os
+import argparse
 from pathlib import Path
-import pandas as pd
 
-def prepare_adfa(base_dir):
-    base_dir = Path(base_dir)
-    records = []
-    splits = ["Training_Data_Master", "Validation_Data_Master", "Attack_Data_Master"]
-
-    for split in splits:
-        split_dir = base_dir / split
-        if not split_dir.exists():
-            print("Missing folder:", split_dir)
-            continue
-        
-        if "attack" in split.lower():
-            lbl = 1
-            split_name = "attack"
-        else:
-            lbl = 0
-            split_name = split.lower().replace("_data_master", "")
+from ingest import DEFAULT_CHUNK_SIZE, DEFAULT_WORKERS, update_store
+from instrumentation import stage
+from trace_store import STORE_DIR, TraceStore
 
-        for root, _, files in os.walk(split_dir):
-            for f in files:
-                fp = Path(root) / f
-                text = fp.read_text(errors="ignore").strip()
-                records.append({
-                    "split": split_name,
-                    "file": f,
-                    "text": text,
-                    "label": lbl
-                })
+def prepare_adfa(base_dir, out_store=STORE_DIR, out_csv=None, workers=DEFAULT_WORKERS,
+                 chunk_size=DEFAULT_CHUNK_SIZE, full=False):
+    """Parse the three ADFA-LD split folders into the trace store (and optionally a CSV).
 
-    df = pd.DataFrame(records)
-    df.to_csv("adfa_parsed.csv", index=False)
-    print("Saved → adfa_parsed.csv:", df.shape)
-    return df
+    Files are read in parallel and written out in chunks of `chunk_size`
+    traces, so memory does not grow with the corpus. When the store already
+    has a manifest only new or changed files are read (`full=True` rebuilds).
+    """
+    base_dir = Path(base_dir)
+    with stage("ingest") as st:
+        stats = update_store(base_dir, out_store, workers=workers, chunk_size=chunk_size, full=full)
+        st.rows = stats.files
+    n_traces = len(TraceStore(out_store))
+    print(f"Saved → {out_store}: {n_traces} traces")
+    if out_csv:
+        with stage("export_csv", rows=n_traces):
+            TraceStore(out_store).to_csv(out_csv, chunk_size)
+    return stats
 
 
 if __name__ == "__main__":
-    prepare_adfa(r"E:\Rev-DataScience\AI-ML\semi-structured\ADFA-LD")
+    parser = argparse.ArgumentParser(description="Parse ADFA-LD into the trace store")
+    parser.add_argument("base_dir", nargs="?", default="ADFA-LD")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--csv", default=None, help="also export adfa_parsed.csv-style text")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild from scratch")
+    args = parser.parse_args()
+    prepare_adfa(args.base_dir, args.store, args.csv, args.workers, args.chunk_size, args.full)
@@ -0,0 +1,122 @@
+# rules.py
+# Declarative feature rules: thresholds are learned from the training-split
+# baseline statistics and stored in a small JSON artifact. Evaluation is a set of
+# NumPy comparisons over a whole batch and returns one hit bitmask per trace.
+import argparse
+import json
+import operator
+from pathlib import Path
+
+import numpy as np
+
+RULES_FILE = "feature_rules.json"
+
+# How each rule threshold is derived from the baseline stats:
+#   "stat" + "factor" -> factor * stats[feature][stat]   (stat: mean/std/min/max or a quantile like "0.99")
+#   "value"           -> fixed threshold
+# "action" is "flag" (any hit -> suspicious, the default) or "pass" (all pass rules
+# hit -> trivially normal, see cascade.py).
+DEFAULT_RULE_SPEC = [
+    {"name": "length", "feature": "length", "op": ">", "stat": "mean", "factor": 2.0,
+     "message": "Length > typical max ({reference:.0f})"},
+    {"name": "unique_calls", "feature": "unique_calls", "op": ">", "stat": "mean", "factor": 2.0,
+     "message": "Unique calls > typical max ({reference:.0f})"},
+    {"name": "mean_call_log", "feature": "mean_call_log", "op": ">", "value": float(np.log1p(1000)),
+     "message": "Mean syscall ID too high"},
+    # inner band of the training distribution on every feature
+    *[{"name": f"{f}_{side}", "feature": f, "op": op, "stat": q, "action": "pass"}
+      for f in ("length", "unique_calls", "mean_call_log")
+      for side, op, q in (("low", ">=", "0.05"), ("high", "<=", "0.95"))],
+]
+
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# --------------------------
+# Learn / save / load
+# --------------------------
+def _stat(stats, feature, name):
+    fs = stats["features"][feature]
+    return fs["quantiles"][name] if name in fs.get("quantiles", {}) else fs[name]
+
+
+def learn_rules(stats, spec=DEFAULT_RULE_SPEC):
+    """Turn a rule spec into concrete thresholds using baseline statistics"""
+    rules = []
+    for r in spec:
+        rule = {k: r[k] for k in ("name", "feature", "op")}
+        rule["action"] = r.get("action", "flag")
+        if "value" in r:
+            rule["reference"] = float(r["value"])
+            rule["threshold"] = float(r["value"])
+        else:
+            rule["reference"] = float(_stat(stats, r["feature"], r["stat"]))
+            rule["threshold"] = float(r.get("factor", 1.0) * rule["reference"])
+        rule["learned_from"] = {k: r[k] for k in ("stat", "factor", "value") if k in r}
+        rule["message"] = r.get("message", f"{r['feature']} {r['op']} {{threshold:g}}")
+        rules.append(rule)
+    if len(rules) > 32:
+        raise ValueError("at most 32 rules fit in the hit bitmask")
+    return {"version": 1, "split": stats.get("split"), "rules": rules}
+
+
+def save_rules(rules, path=RULES_FILE):
+    Path(path).write_text(json.dumps(rules, indent=2))
+    print(f"Feature rules saved → {path}")
+
+
+def load_rules(path=RULES_FILE, stats=None):
+    """Load the rules artifact; without one, learn the default rules from `stats`"""
+    if Path(path).exists():
+        return json.loads(Path(path).read_text())
+    if stats is None:
+        raise FileNotFoundError(path)
+    return learn_rules(stats)
+
+# --------------------------
+# Evaluation
+# --------------------------
+def evaluate_rules(X, rules):
+    """Bitmask of fired rules per row (bit i = rules["rules"][i])"""
+    hits = np.zeros(len(X), dtype=np.uint32)
+    for i, r in enumerate(rules["rules"]):
+        values = np.asarray(X[r["feature"]], dtype=np.float64)
+        hits |= OPS[r["op"]](values, r["threshold"]).astype(np.uint32) << np.uint32(i)
+    return hits
+
+
+def rule_names(rules):
+    return [r["name"] for r in rules["rules"]]
+
+
+def hit_columns(hits, rules):
+    """{name: bool array} view of a hit bitmask, e.g. for output tables"""
+    return {name: ((hits >> np.uint32(i)) & 1) == 1 for i, name in enumerate(rule_names(rules))}
+
+
+def action_mask(rules, action):
+    """Bitmask of the rules with the given action ("flag" or "pass")"""
+    mask = 0
+    for i, r in enumerate(rules["rules"]):
+        if r.get("action", "flag") == action:
+            mask |= 1 << i
+    return np.uint32(mask)
+
+
+def fired_rules(hit, rules, action="flag"):
+    """Rules with the given action that fired for a single bitmask value"""
+    return [r for i, r in enumerate(rules["rules"])
+            if (int(hit) >> i) & 1 and r.get("action", "flag") == action]
+
+
+def describe(rule):
+    return rule["message"].format(reference=rule["reference"], threshold=rule["threshold"])
+
+
+if __name__ == "__main__":
+    from baseline_stats import STATS_FILE, load_baseline_stats
+
+    parser = argparse.ArgumentParser(description="Re-learn feature_rules.json from baseline_stats.json")
+    parser.add_argument("--stats", default=STATS_FILE)
+    parser.add_argument("--out", default=RULES_FILE)
+    args = parser.parse_args()
+    save_rules(learn_rules(load_baseline_stats(args.stats)), args.out)
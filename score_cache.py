@@ -0,0 +1,145 @@
+# score_cache.py
+# Memoized scoring keyed by the content of the syscall sequence.
+#
+# Real traces repeat a lot (the same daemons produce identical sequences), so
+# feature extraction + rules + IsolationForest results are cached per trace under
+# a blake2b hash of the parsed calls. The cache is bounded (LRU eviction), counts
+# hits/misses, can be persisted between runs, and is bound to a key of the model
+# and rules it was filled with: a different key empties it.
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+CACHE_FORMAT = 1
+
+
+def trace_key(calls):
+    """Stable hash of one syscall sequence (independent of dtype and whitespace)"""
+    data = np.ascontiguousarray(calls, dtype=np.int64)
+    return hashlib.blake2b(memoryview(data).cast("B"), digest_size=16).digest()
+
+
+def trace_keys(calls, offsets):
+    """trace_key of every trace of a CSR batch"""
+    data = np.ascontiguousarray(calls, dtype=np.int64)
+    view = memoryview(data).cast("B")
+    offsets = np.asarray(offsets) * data.itemsize
+    return [hashlib.blake2b(view[a:b], digest_size=16).digest()
+            for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def artifact_key(*parts):
+    """Key of the artifacts behind cached results (model hash, rules, ...)"""
+    blob = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key):
+        with self._lock:
+            value = self.data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self.data), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+class ScoreCache(LRUCache):
+    """LRU cache of per-trace scoring results bound to a model/rules key.
+
+    With `path`, entries saved by a previous run are loaded if they were
+    produced with the same `model_key`; call save() to write them back.
+    """
+
+    def __init__(self, maxsize=100_000, path=None, model_key=None):
+        super().__init__(maxsize)
+        self.path = Path(path) if path else None
+        self.model_key = model_key
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def bind(self, model_key):
+        """Switch to another model/rules key, dropping results of the old one"""
+        if model_key != self.model_key:
+            self.clear()
+            self.model_key = model_key
+
+    def map(self, keys, compute):
+        """Cached values for `keys`; compute(idx) scores the missing positions.
+
+        Each distinct missing key is computed once, even if it occurs several
+        times in the batch. compute gets an index array into `keys` and must
+        return one value per index.
+        """
+        values = [self.get(k) for k in keys]
+        first = {}
+        for i, v in enumerate(values):
+            if v is None:
+                first.setdefault(keys[i], i)
+        if first:
+            fresh = dict(zip(first, compute(np.fromiter(first.values(), dtype=np.int64, count=len(first)))))
+            for k, v in fresh.items():
+                self.put(k, v)
+            values = [fresh[k] if v is None else v for k, v in zip(keys, values)]
+        return values
+
+    # ---------------------- persistence ----------------------
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as exc:
+            print(f"Ignoring unreadable score cache {self.path}: {exc}")
+            return
+        if saved.get("format") != CACHE_FORMAT or saved.get("model_key") != self.model_key:
+            print(f"Score cache {self.path} was built for another model; starting empty")
+            return
+        items = saved["items"][-self.maxsize:] if self.maxsize > 0 else []
+        self.data.update(items)
+
+    def save(self, path=None):
+        path = Path(path or self.path)
+        with self._lock:
+            payload = {"format": CACHE_FORMAT, "model_key": self.model_key, "items": list(self.data.items())}
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
@@ -0,0 +1,340 @@
+# scoring_server.py
+# Asyncio JSON scoring service with micro-batching.
+#
+# Concurrent requests are queued and coalesced into micro-batches (up to
+# --max-batch traces, waiting at most --max-wait-ms for the batch to fill) so the
+# feature extraction, rules and IsolationForest run once per batch instead of
+# once per request. The model runs in a worker thread so the event loop keeps
+# accepting requests meanwhile.
+#
+#   python scoring_server.py --port 8080 --max-batch 256 --max-wait-ms 5
+#   python scoring_server.py --unix /tmp/adfa.sock
+#   python scoring_server.py --cascade      # pass rules may skip the model (cascade.py)
+#
+#   POST /score    {"trace": "6 6 63 ..."}  or  {"traces": ["...", ...]}
+#   GET  /metrics  latency percentiles, throughput, batch sizes
+#   GET  /health
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from baseline_stats import STATS_FILE, file_fingerprint, load_baseline_stats
+from cascade import cascade_score
+from compiled_forest import compile_pipeline
+from feature_extraction import FEATURE_COLUMNS, features_from_arrays, take_traces, tokenize
+from rules import RULES_FILE, fired_rules, load_rules
+from score_cache import ScoreCache, artifact_key, trace_keys
+
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT_MS = 5.0
+
+# --------------------------
+# Scoring
+# --------------------------
+class BatchScorer:
+    """Features + flag rules + IsolationForest for a list of trace texts.
+
+    As in the dashboard, a fired flag rule skips the model; with cascade=True
+    the pass rules may also skip it. Results are memoized per distinct syscall
+    sequence (score_cache.py).
+    """
+
+    def __init__(self, model_path=MODEL_FILE, stats_path=STATS_FILE, rules_path=RULES_FILE, cache_size=100_000,
+                 cascade=False):
+        # compiled forest for micro-batches, sklearn for large batches (identical scores)
+        self.pipeline = compile_pipeline(joblib.load(model_path))
+        stats = load_baseline_stats(stats_path) if Path(stats_path).exists() else None
+        self.rules = load_rules(rules_path, stats=stats)
+        self.cascade = cascade
+        self.cache = ScoreCache(cache_size, model_key=artifact_key(file_fingerprint(model_path)["sha256"],
+                                                                   self.rules, cascade))
+
+    def score(self, texts):
+        calls, offsets = tokenize(texts)
+        return self.cache.map(trace_keys(calls, offsets),
+                              lambda idx: self._score(*take_traces(calls, offsets, idx)))
+
+    def _score(self, calls, offsets):
+        X = features_from_arrays(calls, offsets)
+        pred, scores, hits, decided_by = cascade_score(X, self.rules, self.pipeline, pass_rules=self.cascade)
+        results = []
+        for i in range(len(X)):
+            results.append({
+                "pred": int(pred[i]),
+                "status": "suspicious" if pred[i] == -1 else "normal",
+                "score": None if np.isnan(scores[i]) else float(scores[i]),
+                "decided_by": decided_by[i],
+                "rules": [r["name"] for r in fired_rules(hits[i], self.rules)],
+                "features": {c: float(X[c].iat[i]) for c in FEATURE_COLUMNS},
+            })
+        return results
+
+# --------------------------
+# Metrics
+# --------------------------
+class Metrics:
+    """Request latency percentiles over the last `window` requests, plus counters"""
+
+    def __init__(self, window=10_000):
+        self.latency = deque(maxlen=window)   # seconds, enqueue -> result
+        self.done = deque(maxlen=window)      # completion timestamps
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.traces = 0
+        self.batches = 0
+        self.errors = 0
+        self.model_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def add_batch(self, size, seconds):
+        self.batches += 1
+        self.traces += size
+        self.batch_sizes.append(size)
+        self.model_seconds += seconds
+
+    def add_request(self, seconds):
+        self.requests += 1
+        self.latency.append(seconds)
+        self.done.append(time.perf_counter())
+
+    def snapshot(self):
+        lat = np.array(self.latency) * 1e3 if self.latency else np.zeros(1)
+        now = time.perf_counter()
+        # throughput over the recent window (or since start when it is not full yet)
+        span = now - self.done[0] if len(self.done) > 1 else now - self.started
+        return {
+            "uptime_s": round(now - self.started, 3),
+            "requests": self.requests,
+            "traces": self.traces,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else 0.0,
+            "latency_ms_p50": round(float(np.percentile(lat, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(lat, 99)), 3),
+            "latency_ms_max": round(float(lat.max()), 3),
+            "throughput_rps": round(len(self.done) / max(span, 1e-9), 1),
+            "model_seconds": round(self.model_seconds, 3),
+        }
+
+# --------------------------
+# Micro-batcher
+# --------------------------
+class MicroBatcher:
+    """Coalesces concurrent score requests into batches for one model call"""
+
+    def __init__(self, scorer, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS, metrics=None):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.metrics = metrics or Metrics()
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scorer")
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown()
+
+    async def score(self, texts):
+        """Queue the traces of one request and wait for their results"""
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        futures = []
+        for text in texts:
+            fut = loop.create_future()
+            self.queue.put_nowait((text, fut))
+            futures.append(fut)
+        results = await asyncio.gather(*futures)
+        self.metrics.add_request(time.perf_counter() - t0)
+        return results
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            # take whatever is already queued without waiting
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [t for t, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.scorer.score, texts)
+            except Exception:
+                # one bad trace must not fail the other requests of the batch
+                results = await loop.run_in_executor(self.executor, self._score_each, texts)
+            self.metrics.add_batch(len(batch), time.perf_counter() - t0)
+            for (_, fut), res in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(res, Exception):
+                    self.metrics.errors += 1
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+    def _score_each(self, texts):
+        """Results of a failed batch, scored one trace at a time (exceptions in place of results)"""
+        results = []
+        for text in texts:
+            try:
+                results.append(self.scorer.score([text])[0])
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+# --------------------------
+# HTTP (minimal HTTP/1.1 with keep-alive, stdlib only)
+# --------------------------
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 64 * 2 ** 20
+
+
+class ScoringServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._send(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._send(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.route(method, path.split("?", 1)[0], body)
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, {**self.batcher.metrics.snapshot(), "cache": self.batcher.scorer.cache.stats()}
+        if path != "/score":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            req = json.loads(body or b"{}")
+            single = "trace" in req
+            texts = [req["trace"]] if single else req["traces"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected {"trace": "<syscalls>"} or {"traces": [...]}'}
+        if not texts:
+            return 200, {"results": []}
+        try:
+            tokenize(texts)  # invalid traces (e.g. syscall IDs out of range) never reach a batch
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        try:
+            results = await self.batcher.score(texts)
+        except Exception as exc:
+            return 500, {"error": str(exc)}
+        return 200, results[0] if single else {"results": results}
+
+    @staticmethod
+    async def _send(writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8080, unix=None, model_path=MODEL_FILE,
+                max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS, cascade=False):
+    batcher = MicroBatcher(BatchScorer(model_path, cascade=cascade), max_batch, max_wait_ms)
+    batcher.start()
+    app = ScoringServer(batcher)
+    if unix:
+        server = await asyncio.start_unix_server(app.handle, path=unix)
+        where = unix
+    else:
+        server = await asyncio.start_server(app.handle, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Scoring server on {where} (max batch {max_batch}, max wait {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching scoring server for syscall traces")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--cascade", action="store_true", help="let the pass rules short-circuit the model")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.model, args.max_batch, args.max_wait_ms,
+                          args.cascade))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# serving_bundle.py
+# Everything the app needs to score, in one versioned file: the fitted pipeline,
+# the baseline statistics and the feature rules. train_ExIso.py writes it after
+# training; the app loads only this file (no dataset scan, no separate artifacts).
+#
+#   python serving_bundle.py           # rebuild from the existing artifacts
+#   python serving_bundle.py --info    # print the bundle version / sources
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+
+BUNDLE_FILE = os.environ.get("ADFA_SERVING_BUNDLE", "serving_bundle.joblib")
+BUNDLE_FORMAT = 1
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+
+# --------------------------
+# Build / save / load
+# --------------------------
+def build_bundle(pipeline, stats, rules, model_path=MODEL_FILE):
+    """Bundle dict; the version is the sha256 of the model file the pipeline was loaded from / saved to"""
+    from baseline_stats import file_fingerprint
+
+    model_sha256 = file_fingerprint(model_path)["sha256"]
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": model_sha256[:12],
+        "model_sha256": model_sha256,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "pipeline": pipeline,
+        "baseline": stats,
+        "rules": rules,
+    }
+
+
+def save_bundle(bundle, path=BUNDLE_FILE):
+    # uncompressed, so the tree arrays can be memory-mapped on load
+    joblib.dump(bundle, path)
+    print(f"Serving bundle saved → {path} (version {bundle['version']})")
+
+
+def load_bundle(path=BUNDLE_FILE, mmap_mode="r"):
+    bundle = joblib.load(path, mmap_mode=mmap_mode)
+    if bundle.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{path}: unsupported bundle format {bundle.get('format')!r} (expected {BUNDLE_FORMAT})")
+    return bundle
+
+
+def load_serving(path=BUNDLE_FILE):
+    """Pipeline, baseline and rules for serving.
+
+    Uses the bundle when present; otherwise falls back to the separate
+    artifacts (pickle + baseline_stats.json + feature_rules.json), rebuilding
+    the baseline from the dataset if it is missing.
+    """
+    if Path(path).exists():
+        return load_bundle(path)
+
+    from baseline_stats import STATS_FILE, load_baseline_stats, rebuild, stale_sources
+    from rules import load_rules
+
+    print(f"{path} not found; loading separate artifacts (run `python serving_bundle.py`)")
+    if Path(STATS_FILE).exists():
+        baseline = load_baseline_stats()
+        stale = stale_sources(baseline)
+        if stale:
+            print(f"Warning: {STATS_FILE} is stale (changed: {', '.join(stale)}); run `python baseline_stats.py`")
+    else:
+        baseline = rebuild()
+    return build_bundle(joblib.load(MODEL_FILE), baseline, load_rules(stats=baseline), MODEL_FILE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the serving bundle from the trained artifacts")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--out", default=BUNDLE_FILE)
+    parser.add_argument("--info", action="store_true", help="describe an existing bundle")
+    args = parser.parse_args()
+
+    if args.info:
+        bundle = load_bundle(args.out)
+        sources = bundle["baseline"].get("sources", {})
+        print(json.dumps({"version": bundle["version"], "model_sha256": bundle.get("model_sha256"),
+                          "created": bundle["created"],
+                          "rules": len(bundle["rules"]["rules"]), "sources": sources}, indent=2))
+        return
+
+    from baseline_stats import STATS_FILE, load_baseline_stats, stale_sources
+    from rules import load_rules
+
+    stats = load_baseline_stats(STATS_FILE)
+    if "model" in stale_sources(stats, model_path=args.model):
+        print(f"Warning: {STATS_FILE} was built for a different model; run `python baseline_stats.py` first")
+    save_bundle(build_bundle(joblib.load(args.model), stats, load_rules(stats=stats), args.model), args.out)
+
+
+if __name__ == "__main__":
+    main()
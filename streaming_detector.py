@@ -0,0 +1,254 @@
+# streaming_detector.py
+# Online detection on live syscall streams (one stream per PID).
+#
+# Each PID keeps running feature state updated in O(1) per event: length,
+# per-syscall counts (-> unique count), running sum / sum of squares (-> mean,
+# variance) and n-gram counts. With `window` set, the state covers only the last
+# `window` events (the oldest event is removed as a new one arrives). A verdict is
+# emitted every `score_every` events and when a stream is closed, using the same
+# fitted pipeline as the batch paths.
+#
+#   python streaming_detector.py --splits validation attack --score-every 50 --window 500
+import argparse
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_extraction import FEATURE_COLUMNS
+from ngram_features import CALL_BITS, NgramFeaturizer
+
+MODEL_FILE = "unsup_iforest_pipeline.pkl"
+
+
+class StreamState:
+    """Running features of one syscall stream"""
+
+    __slots__ = ("window", "events", "length", "counts", "total", "total_sq", "ngram_max", "ngrams", "recent")
+
+    def __init__(self, window=None, ngram_max=0):
+        self.window = deque() if window else None
+        self.events = 0          # events seen since the stream opened
+        self.length = 0          # events currently covered by the state
+        self.counts = {}         # syscall -> count
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.ngram_max = ngram_max
+        self.ngrams = {}         # (n, code) -> count
+        self.recent = deque(maxlen=max(ngram_max - 1, 0))  # the previous n_max-1 calls
+
+    def add(self, call, window=None):
+        self.events += 1
+        self.length += 1
+        self.counts[call] = self.counts.get(call, 0) + 1
+        self.total += call
+        self.total_sq += call * call
+        if self.ngram_max:
+            code = call
+            self.ngrams[(1, code)] = self.ngrams.get((1, code), 0) + 1
+            if self.ngram_max > 1:
+                # n-grams ending at this event, built from the previous n-1 calls
+                for n, prev in enumerate(reversed(self.recent), start=2):
+                    code = code | (prev << (CALL_BITS * (n - 1)))
+                    self.ngrams[(n, code)] = self.ngrams.get((n, code), 0) + 1
+                self.recent.append(call)
+        if self.window is not None:
+            self.window.append(call)
+            if len(self.window) > window:
+                self._remove_oldest()
+
+    def _remove_oldest(self):
+        old = self.window[0]
+        if self.ngram_max:
+            # n-grams (up to n_max) starting at the oldest event
+            code = 0
+            for n in range(1, min(self.ngram_max, len(self.window)) + 1):
+                code = (code << CALL_BITS) | self.window[n - 1]
+                self._dec(self.ngrams, (n, code))
+        self.window.popleft()
+        self.length -= 1
+        self._dec(self.counts, old)
+        self.total -= old
+        self.total_sq -= old * old
+
+    @staticmethod
+    def _dec(d, key):
+        c = d[key] - 1
+        if c:
+            d[key] = c
+        else:
+            del d[key]
+
+    def features(self):
+        """Same summary features as feature_extraction.features_from_arrays"""
+        mean = self.total / self.length if self.length else 0.0
+        return (self.length, len(self.counts), float(np.log1p(mean)))
+
+
+class StreamingDetector:
+    """Per-PID online scoring with a fitted summary-feature or n-gram pipeline"""
+
+    def __init__(self, pipeline, score_every=100, window=None, ngram_max=None):
+        self.pipeline = pipeline
+        self.score_every = score_every
+        self.window = window
+        first = pipeline.steps[0][1] if hasattr(pipeline, "steps") else None
+        self.featurizer = first if isinstance(first, NgramFeaturizer) else None
+        if ngram_max is None:
+            ngram_max = self.featurizer.n_max if self.featurizer is not None else 0
+        self.ngram_max = ngram_max
+        self.streams = {}
+
+    # ---------------------- events ----------------------
+    def _state(self, pid):
+        st = self.streams.get(pid)
+        if st is None:
+            st = self.streams[pid] = StreamState(self.window, self.ngram_max)
+        return st
+
+    def _snapshot(self, pid, st, reason):
+        # features are captured when the verdict is due, later events must not leak in
+        state = dict(st.ngrams) if self.featurizer is not None else st.features()
+        return pid, st.events, state, reason
+
+    def feed(self, pid, call):
+        """Add one event; returns a verdict when one is due, else None"""
+        st = self._state(pid)
+        st.add(call, self.window)
+        if st.events % self.score_every == 0:
+            return self._score([self._snapshot(pid, st, "periodic")])[0]
+        return None
+
+    def feed_many(self, events):
+        """Add a batch of (pid, call) events; all due verdicts are scored in one model call"""
+        due = []
+        window, every = self.window, self.score_every
+        for pid, call in events:
+            st = self.streams.get(pid)
+            if st is None:
+                st = self._state(pid)
+            st.add(call, window)
+            if st.events % every == 0:
+                due.append(self._snapshot(pid, st, "periodic"))
+        return self._score(due)
+
+    def close(self, pids):
+        """End streams (process exit / window close) and score their final state"""
+        pids = [pids] if np.isscalar(pids) else list(pids)
+        due = [self._snapshot(pid, self.streams.pop(pid), "close") for pid in pids if pid in self.streams]
+        return self._score(due)
+
+    # ---------------------- scoring ----------------------
+    def _score(self, due):
+        if not due:
+            return []
+        states = [state for _, _, state, _ in due]
+        if self.featurizer is not None:
+            X = self.featurizer.transform_counts(states)
+            scores = self.pipeline.steps[-1][1].decision_function(X)
+        else:
+            X = pd.DataFrame(states, columns=FEATURE_COLUMNS)
+            scores = self.pipeline.decision_function(X)
+        return [
+            {"pid": pid, "events": events, "score": float(s), "pred": -1 if s < 0 else 1, "reason": reason}
+            for (pid, events, _, reason), s in zip(due, scores)
+        ]
+
+# --------------------------
+# Replay harness
+# --------------------------
+def replay(traces, labels, detector, concurrency=64, batch_events=4096):
+    """Feed traces as interleaved streams and measure throughput and latency.
+
+    `concurrency` traces are active at a time; their events are interleaved
+    round-robin (like concurrent processes) and fed in batches of
+    `batch_events`. Returns a summary dict.
+    """
+    n = len(traces)
+    first_alarm = {}      # pid -> events seen at first anomaly verdict
+    verdict_latency = []  # seconds from batch arrival to verdict emission
+    final = {}
+    total_events = 0
+
+    pending = deque(range(n))
+    active = {}           # pid -> position in its trace
+    buf = []
+    closing = []          # streams that ended since the last flush
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal buf, closing
+        t0 = time.perf_counter()
+        verdicts = detector.feed_many(buf) + detector.close(closing)
+        dt = time.perf_counter() - t0
+        for v in verdicts:
+            verdict_latency.append(dt)
+            if v["pred"] == -1 and v["pid"] not in first_alarm:
+                first_alarm[v["pid"]] = v["events"]
+            if v["reason"] == "close":
+                final[v["pid"]] = v
+        buf, closing = [], []
+
+    while pending or active:
+        while pending and len(active) < concurrency:
+            active[pending.popleft()] = 0
+        for pid in list(active):
+            pos = active[pid]
+            tr = traces[pid]
+            if pos < len(tr):
+                buf.append((pid, int(tr[pos])))
+                active[pid] = pos + 1
+                total_events += 1
+            else:
+                closing.append(pid)
+                del active[pid]
+        if len(buf) >= batch_events:
+            flush()
+    flush()
+    elapsed = time.perf_counter() - start
+
+    labels = np.asarray(labels)
+    attack = np.flatnonzero(labels == 1)
+    normal = np.flatnonzero(labels == 0)
+    detected = [first_alarm[p] for p in attack if p in first_alarm]
+    lat = np.array(verdict_latency) * 1e3 if verdict_latency else np.zeros(1)
+    return {
+        "traces": n,
+        "events": total_events,
+        "seconds": elapsed,
+        "events_per_sec": total_events / max(elapsed, 1e-9),
+        "verdicts": len(verdict_latency),
+        "latency_ms_p50": float(np.percentile(lat, 50)),
+        "latency_ms_p99": float(np.percentile(lat, 99)),
+        "attack_detection_rate": len(detected) / max(len(attack), 1),
+        "events_to_detect_median": float(np.median(detected)) if detected else None,
+        "normal_alarm_rate": sum(p in first_alarm for p in normal) / max(len(normal), 1),
+    }
+
+
+def main():
+    from trace_store import STORE_DIR, load_split
+
+    parser = argparse.ArgumentParser(description="Replay ADFA-LD traces as live syscall streams")
+    parser.add_argument("--store", default=STORE_DIR, help="trace store (falls back to adfa_parsed.csv)")
+    parser.add_argument("--splits", nargs="+", default=["validation", "attack"])
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--score-every", type=int, default=100)
+    parser.add_argument("--window", type=int, default=None, help="sliding window size in events (default: whole stream)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    calls, offsets, meta = load_split(args.splits, store=args.store)
+    n = len(meta) if args.limit is None else min(args.limit, len(meta))
+    traces = [np.asarray(calls[offsets[i]:offsets[i + 1]]) for i in range(n)]
+    detector = StreamingDetector(joblib.load(args.model), args.score_every, args.window)
+    summary = replay(traces, meta["label"].to_numpy()[:n], detector, args.concurrency)
+    for k, v in summary.items():
+        print(f"{k:>24}: {v:,.3f}" if isinstance(v, float) else f"{k:>24}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# sweep_iforest.py
+# Hyperparameter sweep for the IsolationForest pipeline.
+#
+# Features are computed once and written as .npy files that every worker
+# memory-maps. Configurations are fitted in parallel in a process pool (one core
+# each) and scored on the validation + attack splits. Contamination only moves
+# the decision threshold (offset_ = percentile of the training scores), so each
+# forest is fitted once and evaluated for every contamination value.
+#
+#   python sweep_iforest.py --n-estimators 25 50 100 200 300 --max-samples auto 128 512 \
+#       --contamination auto 0.005 0.01 0.02 --workers 8
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from cli_params import parse_contamination, parse_param
+from feature_cache import load_features
+from trace_store import load_split
+
+RESULTS_FILE = "sweep_results.csv"
+EVAL_SPLITS = ["validation", "attack"]
+DEFAULT = {"n_estimators": 300, "max_samples": "auto", "contamination": 0.01}
+
+# --------------------------
+# Worker side
+# --------------------------
+_data = {}
+
+
+def _init_worker(work_dir):
+    for name in ("X_train", "X_eval", "y_eval"):
+        _data[name] = np.load(os.path.join(work_dir, f"{name}.npy"), mmap_mode="r")
+
+
+def _fit_and_score(n_estimators, max_samples, seed, contaminations):
+    from sklearn.ensemble import IsolationForest
+    from sklearn.metrics import roc_auc_score
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import RobustScaler
+
+    X_train, X_eval, y = _data["X_train"], _data["X_eval"], _data["y_eval"]
+    pipeline = Pipeline([
+        ("scaler", RobustScaler()),
+        ("iforest", IsolationForest(n_estimators=n_estimators, max_samples=max_samples,
+                                    contamination="auto", random_state=seed, n_jobs=1)),
+    ])
+    t0 = time.perf_counter()
+    pipeline.fit(X_train)
+    fit_s = time.perf_counter() - t0
+    train_raw = pipeline.score_samples(X_train)
+
+    t0 = time.perf_counter()
+    raw = pipeline.score_samples(X_eval)
+    score_s = time.perf_counter() - t0
+    auc = roc_auc_score(y, -raw) if 0 < y.sum() < len(y) else float("nan")
+
+    rows = []
+    for c in contaminations:
+        # same threshold IsolationForest.fit would set for this contamination
+        offset = -0.5 if c == "auto" else np.percentile(train_raw, 100.0 * c)
+        flagged = raw - offset < 0
+        rows.append({
+            "n_estimators": n_estimators,
+            "max_samples": max_samples,
+            "contamination": c,
+            "seed": seed,
+            "detection_rate": float(flagged[y == 1].mean()) if (y == 1).any() else float("nan"),
+            "false_positive_rate": float(flagged[y == 0].mean()) if (y == 0).any() else float("nan"),
+            "auc": float(auc),
+            "fit_s": fit_s,
+            "score_s": score_s,
+            "score_us_per_trace": score_s / max(len(y), 1) * 1e6,
+        })
+    return rows
+
+# --------------------------
+# Parent side
+# --------------------------
+def prepare_features(work_dir):
+    """Load the training / evaluation features (feature cache) and save them for memory-mapping"""
+    X_train = load_features("training").to_numpy(dtype=np.float64)
+    X_eval = load_features(EVAL_SPLITS).to_numpy(dtype=np.float64)
+    y_eval = load_split(EVAL_SPLITS)[2]["label"].to_numpy().astype(np.int8)
+    for name, arr in (("X_train", X_train), ("X_eval", X_eval), ("y_eval", y_eval)):
+        np.save(os.path.join(work_dir, f"{name}.npy"), arr)
+    return len(X_train), len(X_eval)
+
+
+def sweep(n_estimators, max_samples, contaminations, seeds=(42,), workers=None, work_dir=None,
+          out_path=RESULTS_FILE, verbose=True):
+    """Fit every (n_estimators, max_samples, seed) forest and write one row per contamination"""
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        n_train, n_eval = prepare_features(tmp)
+        grid = list(itertools.product(n_estimators, max_samples, seeds))
+        if verbose:
+            print(f"{len(grid)} forests x {len(contaminations)} contamination values | "
+                  f"train {n_train:,} / eval {n_eval:,} traces")
+        rows = []
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(tmp,)) as pool:
+            # biggest forests first so the pool does not end on a long straggler
+            futures = [pool.submit(_fit_and_score, n, m, s, list(contaminations))
+                       for n, m, s in sorted(grid, key=lambda g: -g[0])]
+            for i, f in enumerate(as_completed(futures), 1):
+                rows.extend(f.result())
+                if verbose:
+                    print(f"  {i}/{len(grid)} forests done ({time.perf_counter() - start:.1f}s)")
+
+    results = pd.DataFrame(rows)
+    # object columns keep ints and floats apart: max_samples=64 (a count) is not 64.0 (a fraction)
+    for col in ("max_samples", "contamination"):
+        results[col] = pd.Series([r[col] for r in rows], dtype=object)
+    results = (results
+               .sort_values(["n_estimators", "max_samples", "contamination", "seed"],
+                            key=lambda s: s.astype(str) if s.dtype == object else s)
+               .reset_index(drop=True))
+    results.to_csv(out_path, index=False)
+    if verbose:
+        print(f"Sweep results saved → {out_path}")
+    return results
+
+
+def recommend(results, tol=0.01):
+    """Cheapest config whose DR / FPR stay within `tol` of the reference.
+
+    The reference is the current training default if it is in the sweep,
+    otherwise the config with the best AUC.
+    """
+    keys = ["n_estimators", "max_samples", "contamination"]
+    metrics = ["detection_rate", "false_positive_rate", "auc", "fit_s", "score_s"]
+    # grouped by the printed values, with the parameters taken from each config's first row:
+    # grouping on mixed int / float keys would turn max_samples=64 (a count) into 64.0 (a fraction)
+    config = results[keys].astype(str).apply(tuple, axis=1)
+    agg = pd.concat([results.loc[~config.duplicated(), keys].astype(object).reset_index(drop=True),
+                     results.groupby(config, sort=False)[metrics].mean().reset_index(drop=True)], axis=1)
+    is_default = np.logical_and.reduce([agg[k].astype(str) == str(v) for k, v in DEFAULT.items()])
+    ref = agg.index[is_default][0] if is_default.any() else agg["auc"].idxmax()
+    ok = agg[(agg["detection_rate"] >= agg.at[ref, "detection_rate"] - tol)
+             & (agg["false_positive_rate"] <= agg.at[ref, "false_positive_rate"] + tol)]
+    best = ok.sort_values(["score_s", "n_estimators"]).index[0]
+    # object rows keep each column's type (a float64 row would turn n_estimators=25 into 25.0)
+    return agg.loc[ref], agg.loc[best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IsolationForest hyperparameter sweep")
+    parser.add_argument("--n-estimators", nargs="+", type=int, default=[25, 50, 100, 200, 300])
+    parser.add_argument("--max-samples", nargs="+", type=parse_param, default=["auto", 64, 128, 512])
+    parser.add_argument("--contamination", nargs="+", type=parse_contamination,
+                        default=["auto", 0.005, 0.01, 0.02])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[42])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--work-dir", default=None, help="where the memory-mapped feature files go")
+    parser.add_argument("--out", default=RESULTS_FILE)
+    parser.add_argument("--tol", type=float, default=0.01, help="allowed DR / FPR loss for the recommendation")
+    args = parser.parse_args()
+
+    results = sweep(args.n_estimators, args.max_samples, args.contamination, args.seeds,
+                    args.workers, args.work_dir, args.out)
+    ref, best = recommend(results, args.tol)
+    fmt = lambda r: (f"n_estimators={r['n_estimators']} max_samples={r['max_samples']} "
+                     f"contamination={r['contamination']} | DR {r['detection_rate']:.3f} "
+                     f"FPR {r['false_positive_rate']:.3f} AUC {r['auc']:.3f} | score {r['score_s'] * 1e3:.1f} ms")
+    print("reference  : " + fmt(ref))
+    print("recommended: " + fmt(best))
+    print(f"train it with: python train_ExIso.py --n-estimators {best['n_estimators']} "
+          f"--max-samples {best['max_samples']} --contamination {best['contamination']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# tests/test_evaluate_unsupervised.py
+# Regression tests for the single-sort metrics and the score cache of evaluate_unsupervised.py.
+#
+#   python -m pytest -q tests
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import evaluate_unsupervised as ev
+
+
+def tied_scores(n=2000, seed=0):
+    """Labels and anomaly scores with many ties (scores rounded to a coarse grid)"""
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n) < 0.2).astype(int)
+    anomaly = np.round(rng.normal(size=n) + y, 1)
+    return y, anomaly
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_auc_and_ap_match_sklearn_with_ties(seed):
+    y, anomaly = tied_scores(seed=seed)
+    assert len(np.unique(anomaly)) < len(anomaly) // 10
+    metrics, _ = ev.curve_metrics(y, anomaly)
+    assert metrics["roc_auc"] == pytest.approx(roc_auc_score(y, anomaly), abs=1e-12)
+    assert metrics["average_precision"] == pytest.approx(average_precision_score(y, anomaly), abs=1e-12)
+
+
+def test_threshold_curve_counts_every_distinct_threshold():
+    y, anomaly = tied_scores()
+    thresholds, tp, fp = ev.threshold_curve(y, anomaly)
+    assert np.array_equal(thresholds, np.unique(anomaly)[::-1])
+    for t, tp_t, fp_t in zip(thresholds, tp, fp):
+        flagged = anomaly >= t
+        assert tp_t == np.sum(flagged & (y == 1))
+        assert fp_t == np.sum(flagged & (y == 0))
+
+
+@pytest.mark.parametrize("target", [0.0, 0.01, 0.05, 0.5, 1.0])
+def test_threshold_for_fpr_is_the_best_threshold_within_target(target):
+    y, anomaly = tied_scores()
+    metrics, curves = ev.curve_metrics(y, anomaly, [target])
+    t = ev.threshold_for_fpr(curves, target)
+    flagged = anomaly >= t
+    fpr = flagged[y == 0].mean()
+    assert fpr <= target
+    assert flagged[y == 1].mean() == pytest.approx(metrics[f"dr_at_fpr_{target:g}"])
+    # the next lower threshold would exceed the target
+    lower = np.unique(anomaly)[np.unique(anomaly) < t]
+    if len(lower):
+        assert (anomaly >= lower[-1])[y == 0].mean() > target
+
+
+class FeatureModel:
+    """Stand-in for a fitted feature pipeline"""
+    feature_names_in_ = np.array(["length"])
+
+    def decision_function(self, X):
+        return np.asarray(X["length"], dtype=float)
+
+
+def test_cached_scores_depend_on_the_feature_extractor(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.pkl"
+    joblib.dump(FeatureModel(), model_path)
+    calls = []
+
+    def features():
+        calls.append(1)
+        return pd.DataFrame({"length": [1.0, 2.0]})
+
+    inputs = {"features": features}
+    cache_dir = tmp_path / "cache"
+    ev.cached_scores(model_path, inputs, "data", cache_dir)
+    _, hit = ev.cached_scores(model_path, inputs, "data", cache_dir)
+    assert hit and len(calls) == 1
+
+    monkeypatch.setattr(ev, "source_hash", lambda *objects: "edited extractor")
+    _, hit = ev.cached_scores(model_path, inputs, "data", cache_dir)
+    assert not hit and len(calls) == 2
@@ -0,0 +1,47 @@
+# tests/test_feature_extraction.py
+# Regression tests for the tokenizer's parsing and syscall ID range handling.
+#
+#   python -m pytest -q tests
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from feature_extraction import MAX_CALL_ID, features_from_arrays, tokenize
+
+
+def reference(texts):
+    """Per-token Python parsing, as the original per-row code did"""
+    seqs = [[int(t) for t in str(text).split() if t.isdecimal()] for text in texts]
+    offsets = np.r_[0, np.cumsum([len(s) for s in seqs])]
+    return [c for s in seqs for c in s], offsets
+
+
+@pytest.mark.parametrize("texts", [
+    ["6 6 63 6 42 120", "3 4", "5"],
+    ["", "1 2  3\n4", "   ", "0007\t65535"],   # empty traces, mixed whitespace, leading zeros
+    ["1 2 x 3", "abc", "4 -5 6"],               # non-numeric tokens are dropped (slow path)
+    ["00000000000000000000000012 7"],          # more than 18 digits, but in range
+])
+def test_tokenize_matches_python_parsing(texts):
+    calls, offsets = tokenize(texts)
+    ref_calls, ref_offsets = reference(texts)
+    assert calls.tolist() == ref_calls
+    assert offsets.tolist() == ref_offsets.tolist()
+
+
+@pytest.mark.parametrize("text", ["3000000000 5", "9" * 25, f"5 {MAX_CALL_ID + 1}", "5 x 70000"])
+def test_out_of_range_ids_raise_a_clear_error(text):
+    with pytest.raises(ValueError, match="outside the supported range"):
+        tokenize([text])
+
+
+def test_valid_ids_give_finite_features():
+    texts = [f"{MAX_CALL_ID} 0 1", "", "42"]
+    with np.errstate(all="raise"):
+        X = features_from_arrays(*tokenize(texts))
+    assert np.isfinite(X.to_numpy()).all()
+    assert X["unique_calls"].tolist() == [3, 0, 1]
+    assert X["length"].tolist() == [3, 0, 1]
@@ -0,0 +1,305 @@
+# trace_store.py
+# Columnar, memory-mappable trace store (replaces adfa_parsed.csv as interchange format)
+#
+#   adfa_store/
+#     calls.bin    uint16  all syscall IDs, traces concatenated
+#     offsets.bin  int64   n_traces + 1 offsets; trace i = calls[offsets[i]:offsets[i+1]]
+#     labels.bin   int8    0 = normal, 1 = attack
+#     splits.bin   uint8   index into meta["splits"]
+#     files.txt            one file name per trace
+#     meta.json            counts, dtypes, split names, content checksum
+#     manifest.csv         source path / size / mtime / sha1 per trace (incremental ingest)
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = "adfa_store"
+MANIFEST_FILE = "manifest.csv"
+CSV_FILE = "adfa_parsed.csv"
+CALL_DTYPE = np.uint16
+COLUMNS = {
+    "calls": CALL_DTYPE,
+    "offsets": np.int64,
+    "labels": np.int8,
+    "splits": np.uint8,
+}
+SPLIT_NAMES = ["training", "validation", "attack"]
+
+# --------------------------
+# Writer
+# --------------------------
+class TraceStoreWriter:
+    """Streams chunks of ingest records (see ingest.py) into a trace store.
+
+    With append=True new traces are added after the existing ones; the
+    checksum is chained from the previous one.
+    """
+
+    def __init__(self, path=STORE_DIR, append=False):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.splits = list(SPLIT_NAMES)
+        self.n_traces = 0
+        self.n_calls = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+
+        if append and has_store(self.path):
+            meta = json.loads((self.path / "meta.json").read_text())
+            self.splits = meta["splits"]
+            self.n_traces = meta["n_traces"]
+            self.n_calls = meta["n_calls"]
+            self._hash.update(bytes.fromhex(meta["checksum"]))
+            self._truncate_to_meta()
+            mode = "ab"
+        else:
+            mode = "wb"
+        self._fh = {name: open(self.path / f"{name}.bin", mode) for name in COLUMNS}
+        self._files = open(self.path / "files.txt", mode[0], encoding="utf-8")
+        if mode == "wb":
+            self._fh["offsets"].write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def _truncate_to_meta(self):
+        """Drop anything an interrupted write left past the committed meta.json"""
+        sizes = {
+            "calls": self.n_calls,
+            "offsets": self.n_traces + 1,
+            "labels": self.n_traces,
+            "splits": self.n_traces,
+        }
+        for name, count in sizes.items():
+            with open(self.path / f"{name}.bin", "r+b") as fh:
+                fh.truncate(count * np.dtype(COLUMNS[name]).itemsize)
+        files = (self.path / "files.txt").read_text(encoding="utf-8").splitlines()[:self.n_traces]
+        (self.path / "files.txt").write_text("".join(f + "\n" for f in files), encoding="utf-8")
+
+    def _split_code(self, name):
+        if name not in self.splits:
+            self.splits.append(name)
+        return self.splits.index(name)
+
+    def write_chunk(self, records):
+        if not records:
+            return
+        calls = [np.asarray(r["calls"]) for r in records]
+        for c in calls:
+            if c.size and (c.min() < 0 or c.max() > np.iinfo(CALL_DTYPE).max):
+                raise ValueError("syscall ID out of range for the trace store dtype")
+        flat = np.concatenate(calls).astype(CALL_DTYPE) if calls else np.zeros(0, CALL_DTYPE)
+        lengths = np.array([len(c) for c in calls], dtype=np.int64)
+        offsets = self.n_calls + np.cumsum(lengths)
+
+        chunk = {
+            "calls": flat,
+            "offsets": offsets,
+            "labels": np.array([r["label"] for r in records], dtype=np.int8),
+            "splits": np.array([self._split_code(r["split"]) for r in records], dtype=np.uint8),
+        }
+        for name, arr in chunk.items():
+            data = arr.astype(COLUMNS[name]).tobytes()
+            self._fh[name].write(data)
+            self._hash.update(data)
+        self._files.write("".join(r["file"] + "\n" for r in records))
+
+        self.n_traces += len(records)
+        self.n_calls += int(flat.size)
+
+    def close(self):
+        for fh in self._fh.values():
+            fh.close()
+        self._files.close()
+        meta = {
+            "version": 1,
+            "n_traces": self.n_traces,
+            "n_calls": self.n_calls,
+            "dtypes": {name: np.dtype(dt).str for name, dt in COLUMNS.items()},
+            "splits": self.splits,
+            "checksum": self._hash.hexdigest(),
+        }
+        (self.path / "meta.json").write_text(json.dumps(meta, indent=2))
+
+# --------------------------
+# Reader
+# --------------------------
+class TraceStore:
+    """Read-only, memory-mapped view of a trace store"""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self.splits = self.meta["splits"]
+        self.calls = self._map("calls")
+        self.offsets = self._map("offsets")
+        self.labels = self._map("labels")
+        self.split_codes = self._map("splits")
+        self._files = None
+
+    def _map(self, name):
+        fp = self.path / f"{name}.bin"
+        dtype = np.dtype(self.meta["dtypes"][name])
+        if fp.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(fp, dtype=dtype, mode="r")
+
+    def __len__(self):
+        return self.meta["n_traces"]
+
+    @property
+    def files(self):
+        if self._files is None:
+            self._files = (self.path / "files.txt").read_text(encoding="utf-8").splitlines()
+        return self._files
+
+    def trace(self, i):
+        """Zero-copy view of the syscalls of trace i"""
+        return self.calls[self.offsets[i]:self.offsets[i + 1]]
+
+    def split_indices(self, names):
+        names = [names] if isinstance(names, str) else list(names)
+        codes = [self.splits.index(n) for n in names if n in self.splits]
+        return np.flatnonzero(np.isin(self.split_codes, codes))
+
+    def select(self, idx):
+        """(calls, offsets) for the given trace indices.
+
+        A contiguous run of traces is returned as a view into the mapped
+        calls; anything else is gathered into a new array.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        if idx.size == 0:
+            return np.zeros(0, dtype=self.calls.dtype), np.zeros(1, dtype=np.int64)
+        starts, ends = self.offsets[idx], self.offsets[idx + 1]
+        if idx.size == idx[-1] - idx[0] + 1 and np.all(np.diff(idx) == 1):
+            lo, hi = int(starts[0]), int(ends[-1])
+            return self.calls[lo:hi], np.append(starts, hi) - lo
+        lengths = ends - starts
+        offsets = np.zeros(idx.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if offsets[-1] == 0:
+            return np.zeros(0, dtype=self.calls.dtype), offsets
+        # positions of every selected call in the flat array
+        pos = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return self.calls[pos], offsets
+
+    def split(self, names):
+        """(calls, offsets) for one split or a list of splits"""
+        return self.select(self.split_indices(names))
+
+    def frame(self, idx=None):
+        """split / file / label for the given traces as a DataFrame"""
+        idx = np.arange(len(self)) if idx is None else np.asarray(idx, dtype=np.int64)
+        return pd.DataFrame({
+            "split": np.array(self.splits, dtype=object)[self.split_codes[idx]],
+            "file": np.array(self.files, dtype=object)[idx],
+            "label": self.labels[idx].astype(int),
+        }, index=idx)
+
+    def texts(self, idx=None):
+        """Space-separated text of each trace (the CSV representation)"""
+        idx = range(len(self)) if idx is None else idx
+        for i in idx:
+            yield " ".join(map(str, self.trace(i).tolist()))
+
+    def iter_records(self, idx=None, chunk_size=10_000):
+        """Chunks of ingest-style records, e.g. to copy traces into another store"""
+        idx = np.arange(len(self)) if idx is None else np.asarray(idx, dtype=np.int64)
+        for start in range(0, len(idx), chunk_size):
+            part = idx[start:start + chunk_size]
+            calls, offsets = self.select(part)
+            meta = self.frame(part)
+            yield [
+                {"split": s, "file": f, "label": l, "calls": np.asarray(calls[offsets[k]:offsets[k + 1]])}
+                for k, (s, f, l) in enumerate(zip(meta["split"], meta["file"], meta["label"]))
+            ]
+
+    def to_csv(self, path=CSV_FILE, chunk_size=10_000):
+        """Export in the adfa_parsed.csv format"""
+        for start in range(0, max(len(self), 1), chunk_size):
+            idx = np.arange(start, min(start + chunk_size, len(self)))
+            df = self.frame(idx)
+            df.insert(2, "text", list(self.texts(idx)))
+            df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        print(f"Exported → {path}: {len(self)} traces")
+
+# --------------------------
+# Loading helpers used by the entry points
+# --------------------------
+def has_store(path=STORE_DIR):
+    return (Path(path) / "meta.json").exists()
+
+
+def read_manifest(store=STORE_DIR):
+    """Manifest of an existing store (None if there is none), indexed by source path"""
+    fp = Path(store) / MANIFEST_FILE
+    if not has_store(store) or not fp.exists():
+        return None
+    return pd.read_csv(fp, keep_default_na=False, dtype={"path": str, "sha1": str}).set_index("path")
+
+
+def write_manifest(manifest, store=STORE_DIR):
+    # written to a temporary file and renamed: a reader never sees a partial manifest
+    fp = Path(store) / MANIFEST_FILE
+    tmp = fp.with_name(fp.name + ".tmp")
+    manifest.sort_values("trace").to_csv(tmp, index_label="path")
+    os.replace(tmp, fp)
+
+
+def data_source(store=STORE_DIR, csv=CSV_FILE):
+    """File that identifies the current dataset (for fingerprinting)"""
+    return Path(store) / "meta.json" if has_store(store) else Path(csv)
+
+
+def data_fingerprint(store=STORE_DIR, csv=CSV_FILE):
+    """Content hash of the current dataset: the store checksum, else the CSV's sha256"""
+    if has_store(store):
+        return "store-" + json.loads((Path(store) / "meta.json").read_text())["checksum"]
+    h = hashlib.sha256()
+    with open(csv, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return "csv-" + h.hexdigest()
+
+
+def load_split(names=None, store=STORE_DIR, csv=CSV_FILE):
+    """(calls, offsets, frame) for the given split(s) — mmap from the store,
+    falling back to tokenizing the CSV when no store exists."""
+    if has_store(store):
+        ts = TraceStore(store)
+        idx = np.arange(len(ts)) if names is None else ts.split_indices(names)
+        calls, offsets = ts.select(idx)
+        return calls, offsets, ts.frame(idx).reset_index(drop=True)
+
+    from feature_extraction import tokenize
+
+    df = pd.read_csv(csv)
+    if names is not None:
+        df = df[df["split"].isin([names] if isinstance(names, str) else names)]
+    calls, offsets = tokenize(df["text"])
+    return calls, offsets, df.drop(columns="text").reset_index(drop=True)
+
+
+def load_dataframe(store=STORE_DIR, csv=CSV_FILE):
+    """Full split / file / text / label frame (CSV layout) from whichever exists"""
+    if has_store(store):
+        ts = TraceStore(store)
+        df = ts.frame().reset_index(drop=True)
+        df.insert(2, "text", list(ts.texts()))
+        return df
+    return pd.read_csv(csv)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or export a trace store")
+    parser.add_argument("store", nargs="?", default=STORE_DIR)
+    parser.add_argument("--to-csv", metavar="PATH")
+    args = parser.parse_args()
+
+    ts = TraceStore(args.store)
+    print(json.dumps(ts.meta, indent=2))
+    if args.to_csv:
+        ts.to_csv(args.to_csv)
@@ -1,47 +1,32 @@
 # train_unsupervised_full.py
 
+import argparse
 import joblib
-import pandas as pd
-import numpy as np
-from pathlib import Path
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import RobustScaler
 from sklearn.pipeline import Pipeline
-
-# --------------------------
-# Feature Engineering
-# --------------------------
-def make_numeric_features(df):
-    """Extract numeric features from ADFA text logs"""
-    X = pd.DataFrame()
-    X["length"] = df["text"].apply(lambda x: len(str(x).split()))
-    X["unique_calls"] = df["text"].apply(lambda x: len(set(str(x).split())))
-    # mean_call with log-transform to reduce effect of huge numbers
-    X["mean_call_log"] = df["text"].apply(lambda x: np.log1p(np.mean([int(t) for t in str(x).split() if t.isdigit()])))
-    return X
-
-# --------------------------
-# Feature-specific rules
-# --------------------------
-def feature_rules(X):
-    """Optional: apply simple statistical thresholds for obvious anomalies"""
-    rules = np.zeros(len(X), dtype=int)  # 0 = normal, 1 = anomaly
-    # Example: anything with mean_call_log > threshold → anomaly
-    threshold = np.log1p(1000)  # example: mean_call > 1000 before log
-    rules[X["mean_call_log"] > threshold] = 1
-    return rules
+from baseline_stats import compute_baseline_stats, save_baseline_stats
+from cli_params import parse_contamination, parse_param
+from feature_cache import load_features
+from instrumentation import instrument, stage
+from rules import learn_rules, save_rules
+from serving_bundle import MODEL_FILE, build_bundle, save_bundle
+from ngram_features import NgramFeaturizer
+from out_of_core import fit_out_of_core
+from trace_store import load_split
 
 # --------------------------
 # Train Unsupervised Model
 # --------------------------
-def train_unsupervised():
-    # Load CSV
-    df = pd.read_csv("adfa_parsed.csv")
-    df_train = df[df["split"] == "training"]  # normal only
-    print(f"Training samples: {len(df_train)}")
-
-    # Feature extraction
-    X_train = make_numeric_features(df_train)
+@instrument("train")
+def train_unsupervised(n_estimators=300, max_samples="auto", contamination=0.01):
+    """Defaults as before; see sweep_iforest.py for choosing other values"""
+    # Training-split features (normal only), from the feature cache when the data and
+    # extractor are unchanged; otherwise extracted from the trace store / CSV
+    with stage("load_features") as st:
+        X_train = load_features("training")
+        st.rows = len(X_train)
+    print(f"Training samples: {len(X_train)}")
 
     # --------------------------
     # Pipeline: RobustScaler + IsolationForest
@@ -49,28 +34,101 @@ def train_unsupervised():
     pipeline = Pipeline([
         ("scaler", RobustScaler()),
         ("iforest", IsolationForest(
-            n_estimators=300,
-            max_samples="auto",
-            contamination=0.01,  # 1% expected anomalies
+            n_estimators=n_estimators,
+            max_samples=max_samples,
+            contamination=contamination,  # default 1% expected anomalies
             random_state=42
         ))
     ])
 
-    # Fit pipeline
-    pipeline.fit(X_train)
+    # Fit pipeline (step by step, same as pipeline.fit, so each step can be timed)
+    scaler, iforest = pipeline.named_steps["scaler"], pipeline.named_steps["iforest"]
+    with stage("fit_scaler", rows=len(X_train)):
+        X_scaled = scaler.fit_transform(X_train)
+    with stage("fit_iforest", rows=len(X_train)):
+        iforest.fit(X_scaled)
     print("IsolationForest pipeline trained on normal sequences.")
 
+    save_artifacts(pipeline, compute_baseline_stats(X_train))
+
+
+def save_artifacts(pipeline, stats):
+    """Model, baseline stats, learned rules and the serving bundle"""
     # Save pipeline
-    joblib.dump(pipeline, "unsup_iforest_pipeline.pkl")
-    print("Pipeline saved → unsup_iforest_pipeline.pkl")
+    with stage("save_model"):
+        joblib.dump(pipeline, MODEL_FILE)
+    print(f"Pipeline saved → {MODEL_FILE}")
+
+    # Baseline statistics of the normal training features (used by the dashboard)
+    stats = save_baseline_stats(stats)
 
-    # Optional: save rules thresholds for dashboard
-    rules = feature_rules(X_train)
-    np.save("feature_rules.npy", rules)
-    print("Feature-specific rules saved → feature_rules.npy")
+    # Feature-rule thresholds learned from the same statistics
+    rules = learn_rules(stats)
+    save_rules(rules)
+
+    # Everything the app needs in one file
+    save_bundle(build_bundle(pipeline, stats, rules, MODEL_FILE))
+
+# --------------------------
+# Out-of-core training (training split larger than RAM)
+# --------------------------
+@instrument("train_out_of_core")
+def train_out_of_core(n_estimators=300, max_samples="auto", contamination=0.01, memory_budget_mb=256,
+                      sample_rows=100_000):
+    """Same artifacts as train_unsupervised, fitted in one streaming pass (see out_of_core.py)"""
+    pipeline, stats = fit_out_of_core(n_estimators, max_samples, contamination, memory_budget_mb, sample_rows)
+    save_artifacts(pipeline, stats)
+    return pipeline
+
+# --------------------------
+# Alternative feature set: hashed syscall n-grams
+# --------------------------
+def train_ngram(n_max=3, n_features=2 ** 14, memory_budget_mb=256, n_estimators=300, max_samples="auto",
+                contamination=0.01, out_path="unsup_iforest_ngram_pipeline.pkl"):
+    """IsolationForest on sparse n-gram counts; the pipeline takes raw texts or (calls, offsets)"""
+    calls, offsets, meta = load_split("training")  # normal only
+    print(f"Training samples: {len(meta)}")
+
+    pipeline = Pipeline([
+        ("ngrams", NgramFeaturizer(n_max=n_max, n_features=n_features, memory_budget_mb=memory_budget_mb)),
+        ("iforest", IsolationForest(
+            n_estimators=n_estimators,
+            max_samples=max_samples,
+            contamination=contamination,
+            random_state=42
+        ))
+    ])
+    pipeline.fit((calls, offsets))
+    print(f"IsolationForest trained on {n_max}-gram features ({n_features} hashed columns).")
+
+    joblib.dump(pipeline, out_path)
+    print(f"Pipeline saved → {out_path}")
+    return pipeline
 
 # --------------------------
 # Run training
 # --------------------------
 if __name__ == "__main__":
-    train_unsupervised()
+    parser = argparse.ArgumentParser(description="Train the unsupervised IsolationForest")
+    parser.add_argument("--features", choices=["summary", "ngram"], default="summary",
+                        help="summary: length / unique_calls / mean_call_log; ngram: hashed syscall n-grams")
+    parser.add_argument("--ngram-max", type=int, default=3)
+    parser.add_argument("--ngram-features", type=int, default=2 ** 14)
+    parser.add_argument("--memory-budget-mb", type=int, default=256)
+    parser.add_argument("--n-estimators", type=int, default=300)
+    parser.add_argument("--max-samples", type=parse_param, default="auto")
+    parser.add_argument("--contamination", type=parse_contamination, default=0.01)
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="stream the training split in chunks within --memory-budget-mb (summary features)")
+    parser.add_argument("--sample-rows", type=int, default=100_000,
+                        help="out-of-core: reservoir sample size the forest is fitted on")
+    args = parser.parse_args()
+
+    if args.features == "ngram":
+        train_ngram(args.ngram_max, args.ngram_features, args.memory_budget_mb, args.n_estimators,
+                    args.max_samples, args.contamination)
+    elif args.out_of_core:
+        train_out_of_core(args.n_estimators, args.max_samples, args.contamination, args.memory_budget_mb,
+                          args.sample_rows)
+    else:
+        train_unsupervised(args.n_estimators, args.max_samples, args.contamination)